@@ -1,3 +1,102 @@
+import json
+
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .models import Budget, Category, Expense, Income, PaymentMethod, Tag
+
+# Below this many (estimated) rows an exact COUNT(*) is cheap enough.
+EXACT_COUNT_LIMIT = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """Uses the PostgreSQL planner's row estimate instead of COUNT(*) on large results.
+
+    Page links past the real end simply come back empty; other databases get
+    the exact count.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return super().count
+        sql, params = queryset.order_by().values("pk").query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+        if estimate < EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables with millions of rows."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ["user"]
+    list_per_page = 50
+
+
+class TaggedAdmin(LargeTableAdmin):
+    autocomplete_fields = ["category", "tags"]
+    date_hierarchy = "date"
+    ordering = ["-date", "-id"]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related("tags")
+
+    @admin.display(description="Tags")
+    def tag_list(self, obj):
+        return ", ".join(tag.name for tag in obj.tags.all())
+
+
+@admin.register(Expense)
+class ExpenseAdmin(TaggedAdmin):
+    list_display = ["title", "user", "amount", "date", "category", "payment_method", "tag_list"]
+    list_select_related = ["user", "category", "payment_method"]
+    list_filter = ["payment_method"]
+    search_fields = ["title", "=user__username"]
+
+
+@admin.register(Income)
+class IncomeAdmin(TaggedAdmin):
+    list_display = ["source", "user", "amount", "date", "category", "tag_list"]
+    list_select_related = ["user", "category"]
+    search_fields = ["source", "=user__username"]
+
+
+@admin.register(Budget)
+class BudgetAdmin(LargeTableAdmin):
+    list_display = ["user", "month", "amount"]
+    list_select_related = ["user"]
+    date_hierarchy = "month"
+    ordering = ["-month", "-id"]
+    search_fields = ["=user__username"]
+
+
+@admin.register(Tag)
+class TagAdmin(LargeTableAdmin):
+    list_display = ["name", "user"]
+    list_select_related = ["user"]
+    search_fields = ["name", "=user__username"]
+    ordering = ["-id"]
+
+
+@admin.register(Category)
+class CategoryAdmin(LargeTableAdmin):
+    list_display = ["name", "user"]
+    list_select_related = ["user"]
+    search_fields = ["name", "=user__username"]
+    ordering = ["-id"]
+
 
-# Register your models here.
+@admin.register(PaymentMethod)
+class PaymentMethodAdmin(admin.ModelAdmin):
+    list_display = ["method"]
@@ -0,0 +1,172 @@
+from collections import Counter
+from datetime import datetime
+
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth
+
+from .models import Budget, Expense, Income
+from .money import Money
+
+MATRIX_TAG_LIMIT = 15
+
+
+def _monthly_totals(queryset):
+    totals = [Money(0)] * 12
+    rows = (
+        queryset.annotate(month=ExtractMonth("date"))
+        .values("month")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    for row in rows:
+        totals[row["month"] - 1] = row["total"]
+    return totals
+
+
+def yearly_chart_series(user, year):
+    """Monthly income and expense totals for the Home chart, two grouped queries."""
+    return {
+        "labels": [datetime(year, m, 1).strftime("%b") for m in range(1, 13)],
+        "incomes": _monthly_totals(Income.objects.filter(user=user, date__year=year)),
+        "expenses": _monthly_totals(Expense.objects.filter(user=user, date__year=year)),
+    }
+
+
+def month_totals(user_id, month):
+    """Unfiltered dashboard totals for the month starting at ``month``."""
+    def total(queryset):
+        return queryset.aggregate(total=Sum("amount"))["total"] or Money(0)
+
+    income = total(Income.objects.filter(user_id=user_id, date__year=month.year, date__month=month.month))
+    expense = total(Expense.objects.filter(user_id=user_id, date__year=month.year, date__month=month.month))
+    budget = total(Budget.objects.filter(user_id=user_id, month__year=month.year, month__month=month.month))
+    return {"total_income": income, "total_expense": expense, "remaining_budget": budget - expense}
+
+
+def _month_category_totals(queryset):
+    rows = (
+        queryset.annotate(month=ExtractMonth("date"))
+        .values("month", "category_id", "category__name")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    return {(row["month"], row["category_id"]): (row["category__name"], row["total"]) for row in rows}
+
+
+def annual_report_rows(user, year):
+    """Per month and category income/expense totals for the annual report.
+
+    Returns ``(rows, totals)``: rows are ``(month_name, category_name, income,
+    expense, net)`` for every month/category with any activity, and totals is
+    ``(income, expense, net)`` for the whole year. Two grouped queries.
+    """
+    incomes = _month_category_totals(Income.objects.filter(user=user, date__year=year))
+    expenses = _month_category_totals(Expense.objects.filter(user=user, date__year=year))
+
+    rows = []
+    # Within a month, categories in id order with Uncategorized last.
+    for key in sorted(incomes.keys() | expenses.keys(), key=lambda k: (k[0], k[1] is None, k[1] or 0)):
+        month, _category_id = key
+        name, income = incomes.get(key, (None, Money(0)))
+        expense_name, expense = expenses.get(key, (None, Money(0)))
+        rows.append((
+            datetime(year, month, 1).strftime("%B"),
+            name or expense_name or "Uncategorized",
+            income,
+            expense,
+            income - expense,
+        ))
+
+    total_income = Money.total(total for _name, total in incomes.values())
+    total_expense = Money.total(total for _name, total in expenses.values())
+    return rows, (total_income, total_expense, total_income - total_expense)
+
+
+def tag_monthly_spend(user, year):
+    """Return ``(tag_name, [12 monthly totals], year_total)`` rows, biggest spend first.
+
+    One grouped query over the expense/tag through table; tags without spend
+    in ``year`` are left out.
+    """
+    through = Expense.tags.through
+    totals = (
+        through.objects.filter(expense__user=user, expense__date__year=year)
+        .annotate(month=ExtractMonth("expense__date"))
+        .values("tag__name", "month")
+        .annotate(total=Sum("expense__amount"))
+        .order_by("tag__name")
+    )
+
+    by_tag = {}
+    for row in totals:
+        months = by_tag.setdefault(row["tag__name"], [Money(0)] * 12)
+        months[row["month"] - 1] = row["total"]
+
+    rows = [(name, months, Money.total(months)) for name, months in by_tag.items()]
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows
+
+
+def _pair_counts(model, fk_name, user, year):
+    # Self-join of the through table on the transaction id; tag_id < other_tag
+    # keeps each unordered pair once and drops the diagonal.
+    through = model.tags.through
+    other = f"{fk_name}__tags__id"
+    pairs = (
+        through.objects.filter(**{f"{fk_name}__user": user, f"{fk_name}__date__year": year})
+        .filter(**{f"{other}__gt": F("tag_id")})
+        .values("tag_id", other_tag=F(other))
+        .annotate(together=Count("pk"))
+        .order_by()
+    )
+    return {(row["tag_id"], row["other_tag"]): row["together"] for row in pairs}
+
+
+def _usage_counts(model, fk_name, user, year, names):
+    usage = (
+        model.tags.through.objects.filter(**{f"{fk_name}__user": user, f"{fk_name}__date__year": year})
+        .values("tag_id", "tag__name")
+        .annotate(used=Count("pk"))
+        .order_by()
+    )
+    counts = {}
+    for row in usage:
+        names[row["tag_id"]] = row["tag__name"]
+        counts[row["tag_id"]] = row["used"]
+    return counts
+
+
+def tag_cooccurrence(user, year, limit=MATRIX_TAG_LIMIT):
+    """Count how often two tags are attached to the same expense or income in ``year``.
+
+    Returns a dict with ``pairs`` (every co-occurring pair, most frequent first),
+    and ``labels``/``matrix`` for the ``limit`` most used tags, where the
+    diagonal holds how often each tag was used at all.
+    """
+    names = {}
+    usage = Counter(_usage_counts(Expense, "expense", user, year, names))
+    usage.update(_usage_counts(Income, "income", user, year, names))
+
+    together = Counter(_pair_counts(Expense, "expense", user, year))
+    together.update(_pair_counts(Income, "income", user, year))
+
+    pairs = [
+        (names[a], names[b], count)
+        for (a, b), count in together.most_common()
+    ]
+
+    top = [tag_id for tag_id, _used in usage.most_common(limit)]
+    index = {tag_id: i for i, tag_id in enumerate(top)}
+    matrix = [[0] * len(top) for _ in top]
+    for i, tag_id in enumerate(top):
+        matrix[i][i] = usage[tag_id]
+    for (a, b), count in together.items():
+        if a in index and b in index:
+            matrix[index[a]][index[b]] = count
+            matrix[index[b]][index[a]] = count
+
+    return {
+        "pairs": pairs,
+        "labels": [names[tag_id] for tag_id in top],
+        "matrix": matrix,
+    }
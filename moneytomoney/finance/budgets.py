@@ -0,0 +1,67 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .events import publish_totals
+from .ledger import next_month
+from .models import Budget, ChangeCounter
+from .money import Money
+
+MAX_PLAN_MONTHS = 60
+
+
+def month_range(start, end):
+    """Every month start from ``start`` to ``end``, inclusive."""
+    months = []
+    month = start.replace(day=1)
+    while month <= end:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def upsert_budgets(user, amounts):
+    """Set ``user``'s budget for each month in ``amounts`` (month -> Money) with one INSERT ... ON CONFLICT.
+
+    Existing budgets are updated in place, keeping their ids. Bulk writes
+    skip save(), so sequence numbers for sync are reserved here.
+    """
+    if not amounts:
+        return 0
+    with transaction.atomic():
+        start = ChangeCounter.reserve(user.pk, len(amounts))
+        now = timezone.now()
+        Budget.objects.bulk_create(
+            [
+                Budget(user=user, month=month, amount=amount, change_seq=start + i, updated_at=now)
+                for i, (month, amount) in enumerate(sorted(amounts.items()))
+            ],
+            update_conflicts=True,
+            unique_fields=['user', 'month'],
+            update_fields=['amount', 'change_seq', 'updated_at'],
+        )
+        publish_totals(user.pk, amounts)
+    return len(amounts)
+
+
+def _year_before(month):
+    return month.replace(year=month.year - 1)
+
+
+def copied_from_previous_year(user, months, adjust_percent=0):
+    """Last year's budget for each of ``months``, scaled by ``adjust_percent``.
+
+    Months without a budget a year earlier are left out.
+    """
+    factor = 1 + Decimal(adjust_percent) / 100
+    previous = dict(
+        Budget.objects.filter(user=user, month__in=[_year_before(month) for month in months])
+        .values_list('month', 'amount')
+    )
+    amounts = {}
+    for month in months:
+        source = previous.get(_year_before(month))
+        if source is not None:
+            amounts[month] = Money((source.minor * factor).to_integral_value(ROUND_HALF_UP))
+    return amounts
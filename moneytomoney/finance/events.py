@@ -0,0 +1,169 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .analytics import month_totals
+from .money import MoneyJSONEncoder
+
+QUEUE_SIZE = 100
+
+
+def _deliver(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # A client this far behind just reloads; never block the publisher.
+        pass
+
+
+class InProcessBus:
+    """Fans events out to the SSE connections of this process, per user.
+
+    ``publish`` may be called from any thread (sync views run in worker
+    threads); events are handed to each subscriber's event loop.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[user_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            subscribers = self._subscribers[user_id]
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                del self._subscribers[user_id]
+
+    def has_subscribers(self, user_id):
+        return user_id in self._subscribers
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_deliver, queue, event)
+
+
+class RedisBus(InProcessBus):
+    """Shares events between worker processes through Redis pub/sub.
+
+    A process subscribes to a user's channel while it holds at least one of
+    that user's connections and fans the messages out with InProcessBus, so
+    ``PUBSUB NUMSUB`` tells publishers whether anyone is listening at all.
+    """
+
+    channel_prefix = "finance-events:"
+
+    def __init__(self, url=None):
+        super().__init__()
+        import redis
+
+        self.url = url or settings.LIVE_EVENTS_REDIS_URL
+        self._redis = redis.Redis.from_url(self.url)
+        self._pubsub = None
+        self._listener = None
+
+    def _channel(self, user_id):
+        return f"{self.channel_prefix}{user_id}"
+
+    def subscribe(self, user_id):
+        loop = asyncio.get_running_loop()
+        if self._pubsub is None:
+            import redis.asyncio
+
+            self._pubsub = redis.asyncio.Redis.from_url(self.url).pubsub(ignore_subscribe_messages=True)
+        if self._listener is None or self._listener.done():
+            self._listener = loop.create_task(self._listen())
+        first = user_id not in self._subscribers
+        queue = super().subscribe(user_id)
+        if first:
+            loop.create_task(self._pubsub.subscribe(self._channel(user_id)))
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        super().unsubscribe(user_id, queue)
+        if user_id not in self._subscribers:
+            asyncio.get_running_loop().create_task(self._pubsub.unsubscribe(self._channel(user_id)))
+
+    def has_subscribers(self, user_id):
+        # One round trip; saves the totals queries when no worker serves this user.
+        [(_channel, count)] = self._redis.pubsub_numsub(self._channel(user_id))
+        return count > 0
+
+    def publish(self, user_id, event):
+        self._redis.publish(self._channel(user_id), json.dumps(event, cls=MoneyJSONEncoder))
+
+    async def _listen(self):
+        while True:
+            if not self._pubsub.subscribed:
+                # Between the last unsubscribe and the next subscribe there is
+                # no connection to read from.
+                await asyncio.sleep(0.1)
+                continue
+            message = await self._pubsub.get_message(timeout=1.0)
+            if message is None or message["type"] != "message":
+                continue
+            user_id = int(message["channel"].decode().removeprefix(self.channel_prefix))
+            super().publish(user_id, json.loads(message["data"]))
+
+
+_bus = None
+
+
+def get_bus():
+    global _bus
+    if _bus is None:
+        _bus = import_string(getattr(settings, "LIVE_EVENTS_BUS", "finance.events.InProcessBus"))()
+    return _bus
+
+
+def publish_change(instance, action, months):
+    """After commit, tell ``instance.user``'s open dashboards about the change.
+
+    Sends one ``transaction`` event plus fresh ``totals`` for each affected
+    month; nothing is queried when the user has no open connection.
+    """
+    user_id = instance.user_id
+    model = instance._meta.model_name
+    pk = instance.pk
+    months = sorted({month.replace(day=1) for month in months})
+
+    def publish():
+        bus = get_bus()
+        if not bus.has_subscribers(user_id):
+            return
+        for month in months:
+            key = month.strftime("%Y-%m")
+            bus.publish(user_id, {"type": "transaction", "action": action, "model": model, "id": pk, "month": key})
+            bus.publish(user_id, {"type": "totals", "month": key, **month_totals(user_id, month)})
+
+    transaction.on_commit(publish)
+
+
+def publish_totals(user_id, months):
+    """After commit, send fresh ``totals`` for ``months``; for bulk writes that skip signals."""
+    months = sorted({month.replace(day=1) for month in months})
+
+    def publish():
+        bus = get_bus()
+        if not bus.has_subscribers(user_id):
+            return
+        for month in months:
+            bus.publish(user_id, {"type": "totals", "month": month.strftime("%Y-%m"), **month_totals(user_id, month)})
+
+    transaction.on_commit(publish)
+
+
+def sse_message(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, cls=MoneyJSONEncoder)}\n\n"
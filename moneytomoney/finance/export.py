@@ -0,0 +1,98 @@
+import csv
+import json
+from itertools import islice
+
+from .models import Expense, Income
+from .money import MoneyJSONEncoder
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_COLUMNS = ["type", "id", "date", "description", "amount", "category", "payment_method", "tags"]
+
+
+class Echo:
+    """File-like object that hands back whatever is written to it, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _tag_names(through, fk_name, ids):
+    names = {}
+    rows = (
+        through.objects.filter(**{f"{fk_name}__in": ids})
+        .order_by("tag__name")
+        .values_list(fk_name, "tag__name")
+    )
+    for obj_id, tag_name in rows:
+        names.setdefault(obj_id, []).append(tag_name)
+    return names
+
+
+def _ledger_rows(queryset, kind, fields, description_field, fk_name, through):
+    # iterator() streams through a server-side cursor on PostgreSQL, so only one
+    # chunk of rows (plus its tags) is held in memory at a time.
+    rows = queryset.order_by("date", "id").values(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for chunk in _chunks(rows, EXPORT_CHUNK_SIZE):
+        tags = _tag_names(through, fk_name, [row["id"] for row in chunk])
+        for row in chunk:
+            yield {
+                "type": kind,
+                "id": row["id"],
+                "date": row["date"],
+                "description": row[description_field],
+                "amount": str(row["amount"]),
+                "category": row["category__name"] or "",
+                "payment_method": row.get("payment_method__method") or "",
+                "tags": tags.get(row["id"], []),
+            }
+
+
+def ledger_rows(user):
+    """Yield every expense and income of ``user`` as plain dicts, oldest first per type."""
+    yield from _ledger_rows(
+        Expense.objects.filter(user=user),
+        "expense",
+        ["id", "date", "title", "amount", "category__name", "payment_method__method"],
+        "title",
+        "expense_id",
+        Expense.tags.through,
+    )
+    yield from _ledger_rows(
+        Income.objects.filter(user=user),
+        "income",
+        ["id", "date", "source", "amount", "category__name"],
+        "source",
+        "income_id",
+        Income.tags.through,
+    )
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow([
+            row["type"],
+            row["id"],
+            row["date"].isoformat(),
+            row["description"],
+            row["amount"],
+            row["category"],
+            row["payment_method"],
+            ";".join(row["tags"]),
+        ])
+
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=MoneyJSONEncoder) + "\n"
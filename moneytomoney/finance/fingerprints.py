@@ -0,0 +1,16 @@
+import hashlib
+import unicodedata
+
+
+def normalize_text(text):
+    """Case-, width- and whitespace-insensitive form of a title or source."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def transaction_fingerprint(user_id, day, amount, text):
+    """Hash of what makes two transactions the same: user, date, amount and normalized text.
+
+    ``amount`` is Money; the result is 32 hex characters.
+    """
+    key = f"{user_id}|{day.isoformat()}|{amount.minor}|{normalize_text(text)}"
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
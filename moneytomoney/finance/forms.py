@@ -3,7 +3,17 @@ from django.contrib.auth.models import User, Group
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm, PasswordChangeForm
 from .models import Expense, Income, Budget, Tag, Category, PaymentMethod
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.conf import settings
+from django.urls import reverse
 from datetime import date
+from . import typeahead
+from .budgets import MAX_PLAN_MONTHS, copied_from_previous_year, month_range
+from .fingerprints import transaction_fingerprint
+from .ledger import MAX_YEAR, MIN_YEAR
+from .money import Money, MoneyFormField
 
 class LoginForm(AuthenticationForm):
     username = forms.CharField(
@@ -56,7 +66,130 @@ class RegisterForm(UserCreationForm):
             raise ValidationError("Passwords do not match.")
         return password2
 
-class ExpenseForm(forms.ModelForm):
+class TagListMixin:
+    """Adds a free-text ``tag_names`` field whose tags are get-or-created on save.
+
+    Also limits the tag and category choices to the user's own (plus whatever
+    the instance already uses), and switches to typeahead entry when the user
+    has more than TYPEAHEAD_TAG_THRESHOLD tags.
+    """
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+        if user is not None:
+            own_tags = Q(user=user)
+            if self.instance.pk:
+                own_tags |= Q(pk__in=self.instance.tags.values('pk'))
+            self.fields['tags'].queryset = Tag.objects.filter(own_tags)
+            self.fields['category'].queryset = Category.objects.filter(
+                Q(user=user) | Q(pk=self.instance.category_id)
+            )
+
+        self.uses_typeahead = user is not None and typeahead.uses_typeahead(user)
+        if self.uses_typeahead:
+            # Too many tags to list as options: every tag, existing or new, is
+            # then typed into tag_names with autocomplete.
+            self.fields['tags'].widget = forms.MultipleHiddenInput()
+            self.initial['tags'] = []
+            if self.instance.pk:
+                self.initial['tag_names'] = ', '.join(tag.name for tag in self.instance.tags.all())
+            self.fields['tag_names'].widget.attrs.update({
+                'placeholder': 'Tags, comma separated',
+                'autocomplete': 'off',
+                'data-typeahead': reverse('typeahead') + '?kind=tag',
+            })
+
+    def clean_tag_names(self):
+        names = {}
+        for name in self.cleaned_data.get('tag_names', '').split(','):
+            name = name.strip()
+            if not name:
+                continue
+            if len(name) > Tag._meta.get_field('name').max_length:
+                raise ValidationError(f'Tag "{name[:20]}..." is too long.')
+            names.setdefault(name.lower(), name)
+        return list(names.values())
+
+    def _save_m2m(self):
+        super()._save_m2m()
+        names = self.cleaned_data.get('tag_names')
+        if names:
+            self.instance.tags.add(*Tag.get_or_create_many(self.user, names))
+            # bulk_create skips the signals that keep the typeahead index fresh.
+            typeahead.invalidate(self.user.pk)
+
+class DuplicateCheckMixin:
+    """Flags a transaction whose user, date, amount and text match an existing one.
+
+    The check is one lookup on the fingerprint index. With
+    DUPLICATE_TRANSACTIONS = 'warn' ticking ``allow_duplicate`` saves anyway;
+    with 'reject' duplicates are never saved. A copy saved between the check
+    and the save, e.g. by a double submit, is caught by the unique fingerprint
+    constraint in save_unless_duplicate().
+    """
+    duplicate_of = None
+
+    @property
+    def allows_duplicates(self):
+        return settings.DUPLICATE_TRANSACTIONS == 'warn'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        model = self._meta.model
+        text_field = model.fingerprint_text_field
+        matched_fields = ('date', 'amount', text_field)
+        if self.errors or self.user is None:
+            return cleaned_data
+        if self.instance.pk and not any(name in self.changed_data for name in matched_fields):
+            return cleaned_data
+
+        fingerprint = transaction_fingerprint(
+            self.user.pk, cleaned_data['date'], Money.from_decimal(cleaned_data['amount']), cleaned_data[text_field],
+        )
+        duplicate = (
+            model.objects.filter(fingerprint=fingerprint, user=self.user)
+            .exclude(pk=self.instance.pk).order_by('pk').first()
+        )
+        if duplicate is not None and not (self.allows_duplicates and cleaned_data.get('allow_duplicate')):
+            self.duplicate_of = duplicate
+            raise ValidationError(
+                f'This looks like a duplicate of "{getattr(duplicate, text_field)}" '
+                f'({duplicate.amount} on {duplicate.date}).'
+            )
+        self.instance.duplicate_allowed = duplicate is not None
+        return cleaned_data
+
+    def save_unless_duplicate(self, **fields):
+        """Save the instance with ``fields`` set on it, or return None if it would duplicate a row saved since clean()."""
+        instance = self.save(commit=False)
+        for name, value in fields.items():
+            setattr(instance, name, value)
+        try:
+            with transaction.atomic():
+                instance.save()
+                self.save_m2m()
+        except IntegrityError:
+            self.add_error(None, "This transaction has just been saved already.")
+            return None
+        return instance
+
+def _allow_duplicate_field():
+    return forms.BooleanField(
+        required=False,
+        label='Save anyway',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+
+def _tag_names_field():
+    return forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'New tags, comma separated'}),
+    )
+
+class ExpenseForm(DuplicateCheckMixin, TagListMixin, forms.ModelForm):
+    tag_names = _tag_names_field()
+    allow_duplicate = _allow_duplicate_field()
+
     payment_method = forms.ModelChoiceField(
         queryset=PaymentMethod.objects.all(),
         required=True,
@@ -87,7 +220,10 @@ class ExpenseForm(forms.ModelForm):
             raise ValidationError("Date cannot be in the future.")
         return expense_date
 
-class IncomeForm(forms.ModelForm):
+class IncomeForm(DuplicateCheckMixin, TagListMixin, forms.ModelForm):
+    tag_names = _tag_names_field()
+    allow_duplicate = _allow_duplicate_field()
+
     class Meta:
         model = Income
         fields = ['source', 'amount', 'date', 'category', 'tags']
@@ -134,6 +270,57 @@ class BudgetForm(forms.ModelForm):
         month = self.cleaned_data['month']
         return month.replace(day=1)
 
+class BudgetPlanForm(forms.Form):
+    """Budgets for a range of months: one amount for all, or last year's adjusted by a percentage."""
+    start_month = forms.DateField(
+        widget=forms.DateInput(attrs={'type': 'month', 'class': 'form-control'}),
+        input_formats=['%Y-%m'],
+    )
+    end_month = forms.DateField(
+        widget=forms.DateInput(attrs={'type': 'month', 'class': 'form-control'}),
+        input_formats=['%Y-%m'],
+    )
+    mode = forms.ChoiceField(
+        choices=[('set', 'Same amount every month'), ('copy', "Copy last year's budgets")],
+        initial='set',
+        widget=forms.RadioSelect,
+    )
+    amount = MoneyFormField(
+        required=False,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Enter Budget Amount'}),
+    )
+    adjust_percent = forms.DecimalField(
+        required=False, initial=0, min_value=-100, max_digits=5, decimal_places=2,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start_month'), cleaned_data.get('end_month')
+        if start and end:
+            if not (MIN_YEAR <= start.year <= MAX_YEAR and MIN_YEAR <= end.year <= MAX_YEAR):
+                raise ValidationError(f"Plan months between {MIN_YEAR} and {MAX_YEAR}.")
+            # Checked before month_range() so a huge range is never built.
+            span = (end.year - start.year) * 12 + end.month - start.month + 1
+            if span < 1:
+                raise ValidationError("End month must not be before the start month.")
+            if span > MAX_PLAN_MONTHS:
+                raise ValidationError(f"Plan at most {MAX_PLAN_MONTHS} months at once.")
+            cleaned_data['months'] = month_range(start, end)
+        if cleaned_data.get('mode') == 'set':
+            amount = cleaned_data.get('amount')
+            if amount is None or amount <= 0:
+                self.add_error('amount', "Budget amount must be greater than 0.")
+        return cleaned_data
+
+    def amounts(self, user):
+        """Month -> Money to store for ``user``."""
+        months = self.cleaned_data['months']
+        if self.cleaned_data['mode'] == 'copy':
+            return copied_from_previous_year(user, months, self.cleaned_data.get('adjust_percent') or 0)
+        amount = Money.from_decimal(self.cleaned_data['amount'])
+        return {month: amount for month in months}
+
 class TagForm(forms.ModelForm):
     class Meta:
         model = Tag
@@ -142,9 +329,15 @@ class TagForm(forms.ModelForm):
             'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Tag Name'})
         }
 
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+
     def clean_name(self):
         name = self.cleaned_data['name'].strip()
-        if Tag.objects.filter(name__iexact=name).exists():
+        # Matches the (user, lower(name)) unique index, so this is an index lookup.
+        duplicates = Tag.objects.filter(user=self.user).alias(name_lower=Lower('name')).filter(name_lower=name.lower())
+        if duplicates.exclude(pk=self.instance.pk).exists():
             raise ValidationError("Tag with this name already exists.")
         return name
 
@@ -156,12 +349,51 @@ class CategoryForm(forms.ModelForm):
             'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Category Name'})
         }
 
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+
     def clean_name(self):
         name = self.cleaned_data['name'].strip()
-        if Category.objects.filter(name__iexact=name).exists():
+        # Matches the (user, lower(name)) unique index, so this is an index lookup.
+        duplicates = Category.objects.filter(user=self.user).alias(name_lower=Lower('name')).filter(name_lower=name.lower())
+        if duplicates.exclude(pk=self.instance.pk).exists():
             raise ValidationError("Category with this name already exists.")
         return name
 
+class MergeForm(forms.Form):
+    """Pick rows of ``model`` to fold into one target; all choices are limited to ``user``'s own rows."""
+    model = None
+
+    sources = forms.ModelMultipleChoiceField(
+        queryset=None,
+        widget=forms.SelectMultiple(attrs={'class': 'form-select', 'size': 8}),
+    )
+    target = forms.ModelChoiceField(queryset=None, widget=forms.Select(attrs={'class': 'form-select'}))
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+        own = self.model.objects.filter(user=user).order_by(Lower('name'))
+        self.fields['sources'].queryset = own
+        self.fields['target'].queryset = own
+
+    def clean(self):
+        cleaned_data = super().clean()
+        sources, target = cleaned_data.get('sources'), cleaned_data.get('target')
+        if sources is not None and target is not None:
+            sources = [source for source in sources if source.pk != target.pk]
+            if not sources:
+                raise ValidationError("Pick at least one item other than the target.")
+            cleaned_data['sources'] = sources
+        return cleaned_data
+
+class CategoryMergeForm(MergeForm):
+    model = Category
+
+class TagMergeForm(MergeForm):
+    model = Tag
+
 class ProfileForm(forms.ModelForm):
     class Meta:
         model = User
@@ -186,6 +418,22 @@ class ProfileForm(forms.ModelForm):
         return username
 
 
+class DeleteAccountForm(forms.Form):
+    password = forms.CharField(
+        widget=forms.PasswordInput(attrs={'class': 'form-control', 'placeholder': 'Current password'})
+    )
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+
+    def clean_password(self):
+        password = self.cleaned_data['password']
+        if not self.user.check_password(password):
+            raise ValidationError("Password is incorrect.")
+        return password
+
+
 class ChangepassForm(PasswordChangeForm):
     old_password = forms.CharField(
         widget=forms.PasswordInput(attrs={'class':'form-control', 'placeholder':'Old password'})
@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Sum, Value
+from django.db.models.functions import TruncMonth
+
+from .models import BalanceCheckpoint, ChangeCounter, Expense, Income
+from .money import Money, MoneyField
+
+# Checkpoints are written from request handlers that may be reading from a
+# replica; build them from the primary so a lagging copy is never persisted.
+PRIMARY = "default"
+
+# At most this many checkpoints are written by one call; months past them are
+# still summed, so the balance is right, and later calls carry on from there.
+MAX_NEW_CHECKPOINTS = 120
+
+# Dates users may ask about; keeps month arithmetic clear of date.min/date.max.
+MIN_YEAR, MAX_YEAR = 1900, 2100
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def previous_month(month):
+    return (month - timedelta(days=1)).replace(day=1)
+
+
+def month_end(month):
+    return next_month(month) - timedelta(days=1)
+
+
+def signed_amount(instance):
+    return instance.amount if isinstance(instance, Income) else -instance.amount
+
+
+def apply_delta(user_id, day, delta):
+    """Shift every existing checkpoint from ``day``'s month onwards by ``delta``, in one UPDATE.
+
+    Callers have already reserved a sequence number in the same transaction,
+    so they hold the user's ChangeCounter lock; checkpoint_balance() takes the
+    same lock, so a checkpoint is never inserted between a write and its delta.
+    """
+    if delta:
+        BalanceCheckpoint.objects.filter(user_id=user_id, month__gte=month_start(day)).update(
+            balance=F("balance") + Value(delta, output_field=MoneyField())
+        )
+
+
+def _net_by_month(user, since, until, using=None):
+    """Income minus expense in minor units per month, for dates in [since, until]."""
+    net = {}
+    for model, sign in ((Income, 1), (Expense, -1)):
+        rows = model.objects.using(using).filter(user=user, date__lte=until)
+        if since is not None:
+            rows = rows.filter(date__gte=since)
+        rows = rows.annotate(month=TruncMonth("date")).values("month").annotate(total=Sum("amount")).order_by()
+        for row in rows:
+            net[row["month"]] = net.get(row["month"], 0) + sign * row["total"].minor
+    return net
+
+
+def checkpoint_balance(user, month):
+    """Balance at the end of ``month``, materializing missing checkpoints up to it.
+
+    Only the months between the latest existing checkpoint and ``month`` are
+    scanned, with one grouped query per table, and at most
+    MAX_NEW_CHECKPOINTS of them are stored.
+    """
+    checkpoints = BalanceCheckpoint.objects.using(PRIMARY).filter(user=user)
+    latest = checkpoints.filter(month__lte=month).order_by("-month").first()
+    if latest is not None and latest.month == month:
+        return latest.balance
+
+    with transaction.atomic(using=PRIMARY):
+        # Writers hold this lock while they shift checkpoints, so no write can
+        # land between reading the ledger here and inserting the checkpoints.
+        ChangeCounter.objects.using(PRIMARY).select_for_update().get_or_create(user_id=user.pk)
+        latest = checkpoints.filter(month__lte=month).order_by("-month").first()
+        if latest is not None and latest.month == month:
+            return latest.balance
+
+        since = next_month(latest.month) if latest else None
+        net = _net_by_month(user, since, month_end(month), using=PRIMARY)
+        if latest is None and not net:
+            return Money(0)
+
+        balance = latest.balance.minor if latest else 0
+        missing = []
+        current = since or min(net)
+        while current <= month:
+            balance += net.get(current, 0)
+            if len(missing) < MAX_NEW_CHECKPOINTS:
+                missing.append(BalanceCheckpoint(user=user, month=current, balance=Money(balance)))
+            current = next_month(current)
+        checkpoints.bulk_create(missing)
+    return Money(balance)
+
+
+def balance_as_of(user, day):
+    """Balance after every transaction dated on or before ``day``."""
+    start = month_start(day)
+    opening = checkpoint_balance(user, previous_month(start))
+    return opening + Money(sum(_net_by_month(user, start, day).values()))
+
+
+def month_balances(user, month):
+    """Opening and closing balance of the month starting at ``month``."""
+    opening = checkpoint_balance(user, previous_month(month))
+    closing = opening + Money(sum(_net_by_month(user, month, month_end(month)).values()))
+    return opening, closing
@@ -0,0 +1,39 @@
+import json
+import random
+import timeit
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from finance.money import Money, MoneyJSONEncoder
+
+
+class Command(BaseCommand):
+    help = "Compare summing and serializing amounts as Decimal versus integer minor units (Money)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100_000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, rows, repeat, **options):
+        rng = random.Random(42)
+        minors = [rng.randint(1, 10_000_000) for _ in range(rows)]
+        decimals = [Decimal(minor).scaleb(-2) for minor in minors]
+        moneys = [Money(minor) for minor in minors]
+        assert sum(decimals) == Money.total(moneys).to_decimal()
+
+        cases = [
+            ("sum", "Decimal", lambda: sum(decimals)),
+            ("sum", "Money", lambda: Money.total(moneys)),
+            ("str", "Decimal", lambda: [str(value) for value in decimals]),
+            ("str", "Money", lambda: [str(value) for value in moneys]),
+            ("json", "Decimal", lambda: json.dumps(decimals, cls=DjangoJSONEncoder)),
+            ("json", "Money", lambda: json.dumps(moneys, cls=MoneyJSONEncoder)),
+            ("json", "int (minor units)", lambda: json.dumps(minors)),
+        ]
+
+        self.stdout.write(f"{rows} amounts, best of {repeat} runs")
+        for operation, kind, func in cases:
+            best = min(timeit.repeat(func, number=1, repeat=repeat))
+            self.stdout.write(f"{operation:<6}{kind:<20}{best * 1000:10.2f} ms")
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+
+def session_writes(queries):
+    """Statements in ``queries`` that write the django_session table."""
+    return [
+        query for query in queries
+        if "django_session" in query["sql"] and query["sql"].lstrip().upper().startswith(("INSERT", "UPDATE"))
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Count session writes (django_session INSERT/UPDATE, or a re-sent session cookie) "
+        "per request for repeated month views, with the configured SESSION_ENGINE. Runs as a "
+        "throwaway user inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--views", type=int, default=20, help="Repeat views per scenario.")
+        parser.add_argument("--month", default="2024-03")
+
+    def handle(self, *args, views, month, **options):
+        dashboard = reverse("dashboard")
+        scenarios = [
+            ("first dashboard view", [f"{dashboard}?month={month}"]),
+            ("repeat dashboard views", [f"{dashboard}?month={month}"] * views),
+            ("dashboard from session", [dashboard] * views),
+            ("home", [reverse("home")] * views),
+        ]
+
+        self.stdout.write(f"SESSION_ENGINE = {settings.SESSION_ENGINE}")
+        self.stdout.write(f"{'scenario':<26}{'requests':>9}{'db writes':>11}{'cookies':>9}{'writes/request':>16}")
+        with override_settings(ALLOWED_HOSTS=["testserver"], RATE_LIMITS={}), transaction.atomic():
+            user = User.objects.create_user("bench-session-writes")
+            user.user_permissions.set(Permission.objects.filter(
+                content_type__app_label="finance", codename__in=["view_income", "view_expense"],
+            ))
+            client = Client()
+            client.force_login(user)
+
+            for label, urls in scenarios:
+                db_writes = cookies = writing_requests = 0
+                for url in urls:
+                    with CaptureQueriesContext(connection) as queries:
+                        response = client.get(url)
+                    writes = len(session_writes(queries))
+                    cookie = settings.SESSION_COOKIE_NAME in response.cookies
+                    db_writes += writes
+                    cookies += cookie
+                    writing_requests += bool(writes or cookie)
+                per_request = writing_requests / len(urls)
+                self.stdout.write(f"{label:<26}{len(urls):>9}{db_writes:>11}{cookies:>9}{per_request:>16.2f}")
+
+            transaction.set_rollback(True)
@@ -0,0 +1,35 @@
+from statistics import median
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from finance.startup import measure_startup, slowest_imports
+
+
+class Command(BaseCommand):
+    help = "Measure WSGI import time and first-request latency in fresh processes, against STARTUP_BUDGET."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--path", default="/login/")
+        parser.add_argument("--imports", type=int, default=0, help="Also list the N slowest imports of one run.")
+
+    def handle(self, *args, runs, path, imports, **options):
+        results = [measure_startup(path) for _ in range(runs)]
+        budget = settings.STARTUP_BUDGET
+
+        self.stdout.write(f"{runs} cold starts, GET {path} -> {results[-1]['status']}")
+        for key in ("import_seconds", "first_request_seconds"):
+            values = [result[key] for result in results]
+            verdict = "ok" if median(values) <= budget[key] else "OVER BUDGET"
+            self.stdout.write(
+                f"{key:<24}median {median(values) * 1000:8.1f} ms  "
+                f"min {min(values) * 1000:8.1f} ms  budget {budget[key] * 1000:8.1f} ms  {verdict}"
+            )
+        loaded = sorted({name for result in results for name in result["lazy_modules_loaded"]})
+        self.stdout.write(f"lazy modules loaded at startup: {', '.join(loaded) or 'none'}")
+
+        if imports:
+            profile = measure_startup(path, import_profile=True)["import_profile"]
+            for cumulative, module in slowest_imports(profile, imports):
+                self.stdout.write(f"{cumulative / 1000:10.1f} ms  {module}")
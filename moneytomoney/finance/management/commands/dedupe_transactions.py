@@ -0,0 +1,118 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+
+from finance.events import publish_totals
+from finance.ledger import apply_delta, month_start, signed_amount
+from finance.models import Expense, Income
+from finance.money import Money
+from finance.sync import bulk_changes, record_deletions, touch
+
+GROUP_BATCH_SIZE = 500
+
+
+def duplicate_groups(model, user_id=None):
+    """Yield ``(fingerprint, keep_pk)`` for every fingerprint shared by several rows.
+
+    Rows the user chose to keep as duplicates are left out. One grouped scan
+    of the fingerprint index; rows are never compared in pairs.
+    """
+    rows = model.objects.exclude(fingerprint="").exclude(duplicate_allowed=True)
+    if user_id is not None:
+        rows = rows.filter(user_id=user_id)
+    groups = (
+        rows.values("fingerprint")
+        .annotate(rows=Count("pk"), keep=Min("pk"))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for group in groups.iterator(chunk_size=GROUP_BATCH_SIZE):
+        yield group["fingerprint"], group["keep"]
+
+
+def merge_batch(model, groups):
+    """Fold each group into its oldest row: the keeper gets the union of tags, the rest are deleted.
+
+    The duplicates go in one DELETE with the per-row signals silenced; their
+    tombstones are written in one INSERT, balance checkpoints are shifted once
+    per user and month, and open dashboards get fresh totals. Returns the
+    number of rows removed.
+    """
+    keep_by_fingerprint = dict(groups)
+    through = model.tags.through
+    fk_name = f"{model._meta.model_name}_id"
+
+    with transaction.atomic():
+        rows = (
+            model.objects.filter(fingerprint__in=keep_by_fingerprint, duplicate_allowed=False)
+            .only("user", "date", "amount", "fingerprint")
+        )
+        keeper_of = {}
+        keepers_by_user = {}
+        doomed = []
+        for row in rows:
+            keep = keep_by_fingerprint[row.fingerprint]
+            if row.pk == keep:
+                keepers_by_user.setdefault(row.user_id, []).append(row.pk)
+            else:
+                keeper_of[row.pk] = keep
+                doomed.append(row)
+        if not keeper_of:
+            return 0
+
+        links = through.objects.filter(**{f"{fk_name}__in": keeper_of}).values_list(fk_name, "tag_id")
+        through.objects.bulk_create(
+            [through(**{fk_name: keeper_of[pk], "tag_id": tag_id}) for pk, tag_id in links],
+            ignore_conflicts=True,
+        )
+        # The through rows were added without m2m signals; bump the keepers for sync.
+        for user_id, keepers in keepers_by_user.items():
+            touch(model.objects.filter(pk__in=keepers), user_id)
+
+        # Reserving the tombstones' sequence numbers locks each user's counter
+        # before their checkpoints are shifted, as a single delete would.
+        record_deletions(model, [(row.pk, row.user_id) for row in doomed])
+        with bulk_changes():
+            model.objects.filter(pk__in=keeper_of).delete()
+
+        deltas = {}
+        for row in doomed:
+            key = (row.user_id, month_start(row.date))
+            deltas[key] = deltas.get(key, Money(0)) - signed_amount(row)
+        months_by_user = {}
+        for (user_id, month), delta in deltas.items():
+            apply_delta(user_id, month, delta)
+            months_by_user.setdefault(user_id, []).append(month)
+        for user_id, months in months_by_user.items():
+            publish_totals(user_id, months)
+    return len(keeper_of)
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge expenses and incomes that share a fingerprint (same user, date, amount "
+        "and normalized title/source), keeping the oldest row and the union of tags. "
+        "Duplicates the user chose to keep with \"Save anyway\" are left alone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Only this user id.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count duplicates.")
+
+    def handle(self, *args, user=None, dry_run=False, **options):
+        for model in (Expense, Income):
+            label = model._meta.verbose_name_plural
+            groups = duplicate_groups(model, user)
+            if dry_run:
+                count = sum(1 for _group in groups)
+                self.stdout.write(f"{label}: {count} duplicate groups")
+                continue
+
+            # Materialize the groups first so deleting rows cannot disturb the
+            # cursor that is still reading them.
+            groups = list(groups)
+            removed = 0
+            for start in range(0, len(groups), GROUP_BATCH_SIZE):
+                removed += merge_batch(model, groups[start:start + GROUP_BATCH_SIZE])
+                self.stdout.write(f"{label}: {min(start + GROUP_BATCH_SIZE, len(groups))}/{len(groups)} groups, {removed} rows removed")
+            self.stdout.write(self.style.SUCCESS(f"{label}: removed {removed} duplicates in {len(groups)} groups."))
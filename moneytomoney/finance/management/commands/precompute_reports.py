@@ -0,0 +1,124 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Max, Min
+
+from finance.analytics import yearly_chart_series
+from finance.ledger import month_balances, month_start
+from finance.models import ChangeCounter, ReportSnapshot
+from finance.reports import annual_report_data
+from finance.snapshots import snapshot, store_snapshots
+
+# Smaller shards than workers keep every process busy when user ids are
+# unevenly dense.
+SHARDS_PER_WORKER = 4
+STORE_BATCH_SIZE = 100
+
+
+def _init_worker():
+    # Under the "spawn" start method a worker starts from a fresh interpreter;
+    # after "fork" this is a no-op. Either way the worker opens its own
+    # database connection on its first query.
+    django.setup()
+
+
+def precompute_shard(low, high, years, month):
+    """Snapshot the charts and annual reports of active users with ``low <= id < high``.
+
+    Also builds the balance checkpoints behind ``month``'s opening balance.
+    That is the one write here that is not a snapshot: at most
+    MAX_NEW_CHECKPOINTS per user per run (``month`` is the current month, so
+    an account's first run covers its history up to that cap and later runs
+    add about one). Snapshots that are still current are skipped. Returns the
+    number of users.
+    """
+    users = list(User.objects.filter(is_active=True, pk__gte=low, pk__lt=high).order_by("pk"))
+    user_ids = [user.pk for user in users]
+    premium = set(User.objects.filter(pk__in=user_ids, groups__name="premium").values_list("pk", flat=True))
+    versions = dict(ChangeCounter.objects.filter(user_id__in=user_ids).values_list("user_id", "value"))
+    current = set(
+        ReportSnapshot.objects.filter(user_id__in=user_ids, year__in=years)
+        .values_list("user_id", "kind", "year", "version")
+    )
+
+    pending = []
+    for user in users:
+        version = versions.get(user.pk, 0)
+        for year in years:
+            if (user.pk, ReportSnapshot.CHART, year, version) not in current:
+                pending.append(snapshot(user.pk, ReportSnapshot.CHART, year, version, yearly_chart_series(user, year)))
+            if user.pk in premium and (user.pk, ReportSnapshot.ANNUAL_REPORT, year, version) not in current:
+                pending.append(snapshot(
+                    user.pk, ReportSnapshot.ANNUAL_REPORT, year, version, annual_report_data(user, year),
+                ))
+        month_balances(user, month)
+        if len(pending) >= STORE_BATCH_SIZE:
+            store_snapshots(pending)
+            pending = []
+    if pending:
+        store_snapshots(pending)
+    return len(users)
+
+
+def user_id_shards(count):
+    """Split the id range of active users into ``count`` half-open ``(low, high)`` ranges."""
+    bounds = User.objects.filter(is_active=True).aggregate(low=Min("pk"), high=Max("pk"))
+    if bounds["low"] is None:
+        return []
+    low, high = bounds["low"], bounds["high"] + 1
+    step = max(1, -(-(high - low) // count))
+    return [(start, min(start + step, high)) for start in range(low, high, step)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute every user's yearly chart, annual report and opening balance so the "
+        "first visit after a month or year rollover reads stored results. Run nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--year", type=int, action="append", dest="years",
+            help="Year to precompute; repeat for several. Defaults to the current year.",
+        )
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, years=None, workers=1, **options):
+        today = date.today()
+        years = years or [today.year]
+        month = month_start(today)
+        workers = max(1, workers)
+        shards = user_id_shards(workers * SHARDS_PER_WORKER)
+
+        started = time.perf_counter()
+        done = 0
+        if workers == 1:
+            for shard in shards:
+                done += precompute_shard(*shard, years, month)
+                self._progress(done, started, options)
+        else:
+            # Forked workers must not share the parent's open connections.
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                futures = [pool.submit(precompute_shard, *shard, years, month) for shard in shards]
+                for future in as_completed(futures):
+                    done += future.result()
+                    self._progress(done, started, options)
+
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Precomputed {done} users for {', '.join(map(str, years))} in {elapsed:.1f} s "
+            f"with {workers} worker(s): {rate:.1f} users/s."
+        ))
+
+    def _progress(self, done, started, options):
+        if options["verbosity"] > 1:
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"  {done} users, {done / elapsed if elapsed else 0:.1f} users/s")
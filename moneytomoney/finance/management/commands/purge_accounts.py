@@ -0,0 +1,103 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from finance.models import (
+    AccountPurge, BalanceCheckpoint, Budget, Category, ChangeCounter, Expense, Income, Tag, Tombstone,
+)
+from finance.sync import bulk_changes, touch_owners
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def purge_steps(user_id):
+    """``(label, queryset)`` in delete order: rows that reference others go first."""
+    return [
+        ("expense tags", Expense.tags.through.objects.filter(Q(expense__user_id=user_id) | Q(tag__user_id=user_id))),
+        ("income tags", Income.tags.through.objects.filter(Q(income__user_id=user_id) | Q(tag__user_id=user_id))),
+        ("expenses", Expense.objects.filter(user_id=user_id)),
+        ("incomes", Income.objects.filter(user_id=user_id)),
+        ("budgets", Budget.objects.filter(user_id=user_id)),
+        ("balance checkpoints", BalanceCheckpoint.objects.filter(user_id=user_id)),
+        ("tombstones", Tombstone.objects.filter(user_id=user_id)),
+        ("tags", Tag.objects.filter(user_id=user_id)),
+        ("categories", Category.objects.filter(user_id=user_id)),
+        ("change counter", ChangeCounter.objects.filter(user_id=user_id)),
+    ]
+
+
+def detach_other_accounts(user_id):
+    """Unlink other accounts' transactions from this account's tags and categories.
+
+    Only rows created before names were per user can be affected; they are
+    found from the account's own tags and categories through the foreign key
+    indexes, and bumped for sync here because the batched deletes below skip
+    signals.
+    """
+    categories = Category.objects.filter(user_id=user_id).values("pk")
+    tags = Tag.objects.filter(user_id=user_id).values("pk")
+    for model in (Expense, Income):
+        fk_name = model._meta.model_name
+        categorized = model.objects.filter(category__in=categories).exclude(user_id=user_id)
+        tagged = model.objects.filter(
+            pk__in=model.tags.through.objects.filter(tag__in=tags).values(fk_name),
+        ).exclude(user_id=user_id)
+        touch_owners(categorized, category=None)
+        touch_owners(tagged)
+
+
+def delete_in_batches(queryset, batch_size):
+    """Delete ``queryset`` ``batch_size`` rows at a time, each batch in its own short transaction.
+
+    Each batch is one ORM delete inside bulk_changes(), so no tombstones,
+    checkpoint updates or live events are written for an account that is
+    going away. Yields the running total.
+    """
+    model = queryset.model
+    deleted = 0
+    while True:
+        with transaction.atomic(), bulk_changes():
+            pks = list(queryset.values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                return
+            model.objects.filter(pk__in=pks).delete()
+            deleted += len(pks)
+        yield deleted
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the data of accounts queued for deletion in bounded batches with short "
+        "transactions, then the accounts themselves."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Only this user id.")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            "--pause", type=float, default=0.05,
+            help="Seconds to sleep between batches, leaving room for other writers and replication.",
+        )
+
+    def handle(self, *args, user=None, batch_size=DEFAULT_BATCH_SIZE, pause=0.05, **options):
+        purges = AccountPurge.objects.select_related("user").order_by("requested_at")
+        if user is not None:
+            purges = purges.filter(user_id=user)
+
+        for purge in purges:
+            account = purge.user
+            self.stdout.write(f"Purging {account.username} (id {account.pk}), requested {purge.requested_at:%Y-%m-%d %H:%M}")
+            detach_other_accounts(account.pk)
+            for label, queryset in purge_steps(account.pk):
+                deleted = 0
+                for deleted in delete_in_batches(queryset, batch_size):
+                    if options["verbosity"] > 1:
+                        self.stdout.write(f"  {label}: {deleted}")
+                    time.sleep(pause)
+                self.stdout.write(f"  {label}: {deleted} deleted")
+
+            # Only a handful of rows are left, so the cascade is cheap now.
+            account.delete()
+            self.stdout.write(self.style.SUCCESS(f"Purged {account.username}."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from finance.models import BalanceCheckpoint
+
+
+class Command(BaseCommand):
+    help = (
+        "Drop balance checkpoints so they are rebuilt from the ledger on next use. "
+        "Run after editing amounts or dates outside the ORM's save()/delete()."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Only this user id.")
+
+    def handle(self, *args, user=None, **options):
+        checkpoints = BalanceCheckpoint.objects.all()
+        if user is not None:
+            checkpoints = checkpoints.filter(user_id=user)
+        deleted, _ = checkpoints.delete()
+        self.stdout.write(self.style.SUCCESS(f"Dropped {deleted} checkpoints."))
@@ -0,0 +1,86 @@
+from django.db import connection, transaction
+
+from . import typeahead
+from .models import Expense, Income
+from .sync import touch
+
+
+def _own_sources(user, sources, target):
+    """Ids of ``sources`` that belong to ``user``, other than ``target``; none if ``target`` is not theirs."""
+    if target.user_id != user.pk:
+        return []
+    return list(
+        type(target).objects.filter(user=user, pk__in=[source.pk for source in sources])
+        .exclude(pk=target.pk).values_list("pk", flat=True)
+    )
+
+
+def merge_categories(user, sources, target):
+    """Move every transaction of ``sources`` into ``target``, then delete ``sources``.
+
+    Only ``user``'s own categories and rows are touched. One UPDATE per table
+    reassigns the rows and bumps them for sync, which also retires their
+    cached dashboard rows. Returns the number of rows moved.
+    """
+    source_ids = _own_sources(user, sources, target)
+    if not source_ids:
+        return 0
+    with transaction.atomic():
+        moved = sum(
+            touch(model.objects.filter(user=user, category_id__in=source_ids), user.pk, category=target)
+            for model in (Expense, Income)
+        )
+        # Nothing points at the sources any more, so the delete is just the
+        # category rows and their tombstones.
+        type(target).objects.filter(pk__in=source_ids).delete()
+        typeahead.invalidate(user.pk)
+    return moved
+
+
+def _link_target(model, user, source_ids, target):
+    """Tag each of ``user``'s ``model`` rows tagged with ``source_ids`` with ``target``, in one INSERT ... SELECT.
+
+    Rows already tagged with ``target`` are skipped by the through table's
+    unique constraint.
+    """
+    through = model.tags.through
+    qn = connection.ops.quote_name
+    fk = qn(through._meta.get_field(model._meta.model_name).column)
+    tag = qn(through._meta.get_field("tag").column)
+    placeholders = ", ".join(["%s"] * len(source_ids))
+    sql = (
+        f"INSERT INTO {qn(through._meta.db_table)} ({fk}, {tag}) "
+        f"SELECT DISTINCT link.{fk}, %s FROM {qn(through._meta.db_table)} link "
+        f"INNER JOIN {qn(model._meta.db_table)} tagged ON tagged.{qn(model._meta.pk.column)} = link.{fk} "
+        f"WHERE link.{tag} IN ({placeholders}) AND tagged.{qn(model._meta.get_field('user').column)} = %s "
+        f"ON CONFLICT DO NOTHING"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [target.pk, *source_ids, user.pk])
+
+
+def merge_tags(user, sources, target):
+    """Retag every transaction of ``sources`` with ``target``, then delete ``sources``.
+
+    Only ``user``'s own tags and rows are touched. Through-table rows are
+    remapped set-wise in the database: one INSERT ... SELECT adds ``target``
+    to each tagged row (skipping rows that already have it) and one DELETE
+    drops the old links, so no row ends up with the same tag twice. Returns
+    the number of rows retagged.
+    """
+    source_ids = _own_sources(user, sources, target)
+    if not source_ids:
+        return 0
+    retagged = 0
+    with transaction.atomic():
+        for model in (Expense, Income):
+            links = model.tags.through.objects.filter(tag_id__in=source_ids, **{f"{model._meta.model_name}__user": user})
+            _link_target(model, user, source_ids, target)
+            # The links change without m2m signals; bump the rows for sync.
+            retagged += touch(
+                model.objects.filter(pk__in=links.values(model._meta.model_name)), user.pk,
+            )
+            links.delete()
+        type(target).objects.filter(pk__in=source_ids).delete()
+        typeahead.invalidate(user.pk)
+    return retagged
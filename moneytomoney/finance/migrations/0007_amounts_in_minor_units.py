@@ -0,0 +1,74 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Cast, Round
+
+import finance.money
+
+
+MONEY_MODELS = ['expense', 'income', 'budget']
+
+
+def to_minor_units(apps, schema_editor):
+    for model_name in MONEY_MODELS:
+        model = apps.get_model('finance', model_name)
+        model.objects.update(amount_minor=Cast(Round(F('amount') * 100), models.BigIntegerField()))
+
+
+def to_decimal_amounts(apps, schema_editor):
+    # Done in Python so the division is exact on every backend.
+    for model_name in MONEY_MODELS:
+        model = apps.get_model('finance', model_name)
+        batch = []
+        for row in model.objects.only('pk', 'amount_minor').iterator(chunk_size=2000):
+            row.amount = Decimal(row.amount_minor).scaleb(-2)
+            batch.append(row)
+            if len(batch) == 2000:
+                model.objects.bulk_update(batch, ['amount'])
+                batch = []
+        model.objects.bulk_update(batch, ['amount'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0006_per_user_names'),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name=model_name,
+                name='amount_minor',
+                field=models.BigIntegerField(null=True),
+            )
+            for model_name in MONEY_MODELS
+        ],
+        # Nullable so the reverse migration can re-add the column before refilling it.
+        *[
+            migrations.AlterField(
+                model_name=model_name,
+                name='amount',
+                field=models.DecimalField(max_digits=10, decimal_places=2, null=True),
+            )
+            for model_name in MONEY_MODELS
+        ],
+        migrations.RunPython(to_minor_units, to_decimal_amounts),
+        *[
+            migrations.RemoveField(model_name=model_name, name='amount')
+            for model_name in MONEY_MODELS
+        ],
+        *[
+            migrations.RenameField(model_name=model_name, old_name='amount_minor', new_name='amount')
+            for model_name in MONEY_MODELS
+        ],
+        *[
+            migrations.AlterField(
+                model_name=model_name,
+                name='amount',
+                field=finance.money.MoneyField(),
+            )
+            for model_name in MONEY_MODELS
+        ],
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def drop_duplicate_budgets(apps, schema_editor):
+    # Keep the most recently written budget of each (user, month) and leave
+    # tombstones for the others so synced clients drop them too.
+    Budget = apps.get_model('finance', 'Budget')
+    ChangeCounter = apps.get_model('finance', 'ChangeCounter')
+    Tombstone = apps.get_model('finance', 'Tombstone')
+    duplicated = (
+        Budget.objects.values('user_id', 'month')
+        .annotate(rows=Count('pk')).filter(rows__gt=1).order_by()
+    )
+    for group in duplicated.iterator():
+        rows = Budget.objects.filter(user_id=group['user_id'], month=group['month'])
+        stale = list(rows.order_by('-change_seq', '-pk').values_list('pk', flat=True)[1:])
+        counter, _ = ChangeCounter.objects.get_or_create(user_id=group['user_id'])
+        Tombstone.objects.bulk_create([
+            Tombstone(user_id=group['user_id'], model='budget', object_id=pk, change_seq=counter.value + i + 1)
+            for i, pk in enumerate(stale)
+        ])
+        counter.value += len(stale)
+        counter.save(update_fields=['value'])
+        Budget.objects.filter(pk__in=stale).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0009_transaction_date_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_budgets, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='budget',
+            constraint=models.UniqueConstraint(fields=('user', 'month'), name='finance_budget_user_month_uniq'),
+        ),
+    ]
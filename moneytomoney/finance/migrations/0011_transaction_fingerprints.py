@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+from finance.fingerprints import transaction_fingerprint
+
+BATCH_SIZE = 2000
+
+
+def fill_fingerprints(apps, schema_editor):
+    # Keyset batches, so memory stays flat on large tables; change_seq is left
+    # alone because the synced fields do not change.
+    for model_name, text_field in (('Expense', 'title'), ('Income', 'source')):
+        model = apps.get_model('finance', model_name)
+        last_pk = 0
+        while True:
+            rows = list(
+                model.objects.filter(pk__gt=last_pk).order_by('pk')
+                .only('pk', 'user_id', 'date', 'amount', text_field)[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+            for row in rows:
+                row.fingerprint = transaction_fingerprint(row.user_id, row.date, row.amount, getattr(row, text_field))
+            model.objects.bulk_update(rows, ['fingerprint'], batch_size=500)
+            last_pk = rows[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0010_budget_user_month_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='fingerprint',
+            field=models.CharField(default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='fingerprint',
+            field=models.CharField(default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(fill_fingerprints, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['fingerprint'], name='finance_expense_fprint_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['fingerprint'], name='finance_income_fprint_idx'),
+        ),
+    ]
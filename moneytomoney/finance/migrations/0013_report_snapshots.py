@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0012_account_purge'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('chart', 'Yearly chart'), ('annual_report', 'Annual report')], max_length=20)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('version', models.BigIntegerField()),
+                ('data', models.JSONField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'kind', 'year'), name='finance_snapshot_user_kind_year_uniq')],
+            },
+        ),
+    ]
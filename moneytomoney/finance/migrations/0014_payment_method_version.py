@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0013_report_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentmethod',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:50
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def mark_legacy_duplicates(apps, schema_editor):
+    # Duplicates saved before the constraint stay until dedupe_transactions
+    # merges them; unlike rows the user kept on purpose, they are merged.
+    # Each group's oldest row is the one the constraint protects.
+    for model_name in ('Expense', 'Income'):
+        rows = apps.get_model('finance', model_name).objects.exclude(fingerprint='')
+        oldest = rows.values('user_id', 'fingerprint').annotate(keep=Min('pk')).values('keep')
+        rows.exclude(pk__in=oldest).update(legacy_duplicate=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0014_payment_method_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='duplicate_allowed',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='legacy_duplicate',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='duplicate_allowed',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='legacy_duplicate',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(mark_legacy_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='expense',
+            constraint=models.UniqueConstraint(condition=models.Q(models.Q(('fingerprint', ''), _negated=True), ('duplicate_allowed', False), ('legacy_duplicate', False)), fields=('user', 'fingerprint'), name='finance_expense_fprint_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='income',
+            constraint=models.UniqueConstraint(condition=models.Q(models.Q(('fingerprint', ''), _negated=True), ('duplicate_allowed', False), ('legacy_duplicate', False)), fields=('user', 'fingerprint'), name='finance_income_fprint_uniq'),
+        ),
+    ]
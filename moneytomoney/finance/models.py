@@ -1,9 +1,108 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
 from django.contrib.auth.models import User
+from .fingerprints import transaction_fingerprint
+from .money import MoneyField
 
-class Category(models.Model):
-    name = models.CharField(max_length=50, unique=True)
+class ChangeCounter(models.Model):
+    """Per-user monotonic change sequence used by the sync endpoint."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='change_counter')
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def reserve(cls, user_id, count=1):
+        """Reserve ``count`` consecutive sequence numbers for ``user_id`` and return the first.
+
+        The counter row stays locked until the surrounding transaction ends, so
+        a user's writes commit in the same order as their sequence numbers.
+        """
+        with transaction.atomic():
+            counter, _ = cls.objects.select_for_update().get_or_create(user_id=user_id)
+            start = counter.value + 1
+            counter.value += count
+            counter.save(update_fields=['value'])
+        return start
+
+class SyncTracked(models.Model):
+    updated_at = models.DateTimeField(auto_now=True)
+    change_seq = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+        indexes = [
+            models.Index(fields=['user', 'change_seq'], name='%(app_label)s_%(class)s_sync_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'change_seq', 'updated_at'}
+        # One transaction, so the counter stays locked until the row commits and
+        # a higher sequence number can never become visible before a lower one.
+        with transaction.atomic():
+            self.change_seq = ChangeCounter.reserve(self.user_id)
+            super().save(*args, **kwargs)
+            # Until commit, m2m changes need no second sequence number.
+            self._saved_this_transaction = True
+            transaction.on_commit(lambda: self.__dict__.pop('_saved_this_transaction', None))
+
+class Fingerprinted(SyncTracked):
+    """A transaction that keeps a hash of user, date, amount and its normalized text.
+
+    Rows with equal fingerprints are treated as duplicates. Only one of them may
+    be saved without ``duplicate_allowed``, which the forms set when the user
+    chose to keep a duplicate, or ``legacy_duplicate``, which marks duplicates
+    saved before the check existed until dedupe_transactions merges them.
+    """
+    fingerprint = models.CharField(max_length=32, default='', editable=False)
+    duplicate_allowed = models.BooleanField(default=False, editable=False)
+    legacy_duplicate = models.BooleanField(default=False, editable=False)
+
+    # Name of the free-text field that goes into the fingerprint.
+    fingerprint_text_field = None
+
+    class Meta(SyncTracked.Meta):
+        abstract = True
+
+    def compute_fingerprint(self):
+        return transaction_fingerprint(self.user_id, self.date, self.amount, getattr(self, self.fingerprint_text_field))
+
+    def save(self, *args, **kwargs):
+        self.fingerprint = self.compute_fingerprint()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'fingerprint'}
+        super().save(*args, **kwargs)
+
+    def find_duplicate(self):
+        """Another of the user's rows with the same fingerprint, via the fingerprint index."""
+        return (
+            type(self).objects.filter(fingerprint=self.compute_fingerprint(), user_id=self.user_id)
+            .exclude(pk=self.pk).order_by('pk').first()
+        )
+
+class Tombstone(models.Model):
+    """Marks a synced row as deleted so offline clients can drop their copy."""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    change_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'change_seq'], name='finance_tombstone_sync_idx'),
+        ]
+
+class Category(SyncTracked):
+    name = models.CharField(max_length=50)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    class Meta(SyncTracked.Meta):
+        constraints = [
+            models.UniqueConstraint('user', Lower('name'), name='finance_category_user_name_uniq'),
+        ]
     
     def __str__(self):
         return self.name
@@ -15,35 +114,149 @@ class PaymentMethod(models.Model):
         ('CREDIT', 'Credit'),
     ]
     method = models.CharField(max_length=10, choices=METHOD_CHOICES)
+    # Bumped on every save; part of the dashboard row cache key.
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.version += 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'version'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.method
 
-class Tag(models.Model):
-    name = models.CharField(max_length=50, unique=True)
+class Tag(SyncTracked):
+    name = models.CharField(max_length=50)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    class Meta(SyncTracked.Meta):
+        constraints = [
+            models.UniqueConstraint('user', Lower('name'), name='finance_tag_user_name_uniq'),
+        ]
+
     def __str__(self):
         return self.name
 
-class Expense(models.Model):
+    @classmethod
+    def get_or_create_many(cls, user, names):
+        """Return ``user``'s tags matching ``names`` case-insensitively, creating missing ones.
+
+        Missing tags are inserted with a single ``bulk_create``; names that
+        already exist are skipped by the (user, lower(name)) constraint.
+        """
+        by_lower = {name.lower(): name for name in names}
+        if not by_lower:
+            return []
+        start = ChangeCounter.reserve(user.pk, len(by_lower))
+        cls.objects.bulk_create(
+            [cls(user=user, name=name, change_seq=start + i) for i, name in enumerate(by_lower.values())],
+            ignore_conflicts=True,
+        )
+        return list(cls.objects.filter(user=user).alias(name_lower=Lower('name')).filter(name_lower__in=by_lower))
+
+class Expense(Fingerprinted):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
     payment_method = models.ForeignKey(PaymentMethod, on_delete=models.SET_NULL, null=True, blank=True)
     title = models.CharField(max_length=100)
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    amount = MoneyField()
     date = models.DateField()
     tags = models.ManyToManyField(Tag, blank=True)
 
-class Income(models.Model):
+    fingerprint_text_field = 'title'
+
+    class Meta(SyncTracked.Meta):
+        indexes = SyncTracked.Meta.indexes + [
+            models.Index(fields=['user', 'date'], name='finance_expense_user_date_idx'),
+            models.Index(fields=['date'], name='finance_expense_date_idx'),
+            models.Index(fields=['fingerprint'], name='finance_expense_fprint_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'fingerprint'],
+                condition=~Q(fingerprint='') & Q(duplicate_allowed=False, legacy_duplicate=False),
+                name='finance_expense_fprint_uniq',
+            ),
+        ]
+
+class Income(Fingerprinted):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     source = models.CharField(max_length=100)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
     tags = models.ManyToManyField(Tag, blank=True)
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    amount = MoneyField()
     date = models.DateField()
 
-class Budget(models.Model):
+    fingerprint_text_field = 'source'
+
+    class Meta(SyncTracked.Meta):
+        indexes = SyncTracked.Meta.indexes + [
+            models.Index(fields=['user', 'date'], name='finance_income_user_date_idx'),
+            models.Index(fields=['date'], name='finance_income_date_idx'),
+            models.Index(fields=['fingerprint'], name='finance_income_fprint_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'fingerprint'],
+                condition=~Q(fingerprint='') & Q(duplicate_allowed=False, legacy_duplicate=False),
+                name='finance_income_fprint_uniq',
+            ),
+        ]
+
+class Budget(SyncTracked):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    month = models.DateField()
+    amount = MoneyField()
+
+    class Meta(SyncTracked.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month'], name='finance_budget_user_month_uniq'),
+        ]
+
+class BalanceCheckpoint(models.Model):
+    """A user's balance (all income minus all expense) at the end of ``month``."""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     month = models.DateField()
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    balance = MoneyField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month'], name='finance_checkpoint_user_month_uniq'),
+        ]
+
+class AccountPurge(models.Model):
+    """A deactivated account waiting for ``manage.py purge_accounts`` to delete its data."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='purge')
+    requested_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def request(cls, user):
+        """Deactivate ``user`` right away and queue the account for purging."""
+        with transaction.atomic():
+            user.is_active = False
+            user.save(update_fields=['is_active'])
+            cls.objects.get_or_create(user=user)
+
+class ReportSnapshot(models.Model):
+    """Report data precomputed by ``manage.py precompute_reports``.
+
+    A snapshot is only used while ``version`` still equals the user's ledger
+    version, so any write makes it stale without an explicit invalidation.
+    """
+    CHART = 'chart'
+    ANNUAL_REPORT = 'annual_report'
+    KIND_CHOICES = [(CHART, 'Yearly chart'), (ANNUAL_REPORT, 'Annual report')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    year = models.PositiveSmallIntegerField()
+    version = models.BigIntegerField()
+    data = models.JSONField()
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'kind', 'year'], name='finance_snapshot_user_kind_year_uniq'),
+        ]
@@ -0,0 +1,166 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from functools import total_ordering
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+from django.utils.functional import cached_property
+
+MINOR_UNITS = 100
+
+
+@total_ordering
+class Money:
+    """Immutable amount held as an integer number of minor units (satang)."""
+
+    __slots__ = ("minor",)
+
+    def __init__(self, minor=0):
+        object.__setattr__(self, "minor", int(minor))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Money is immutable.")
+
+    def __reduce__(self):
+        # Pickling, copy() and deepcopy() would otherwise restore state via setattr.
+        return (Money, (self.minor,))
+
+    @classmethod
+    def from_decimal(cls, value):
+        try:
+            minor = (Decimal(value) * MINOR_UNITS).to_integral_value(ROUND_HALF_UP)
+        except (InvalidOperation, TypeError, ValueError):
+            raise ValueError(f"{value!r} is not a valid amount.")
+        return cls(minor)
+
+    @classmethod
+    def total(cls, amounts):
+        """Sum an iterable of Money in plain integers."""
+        return cls(sum(amount.minor for amount in amounts))
+
+    def to_decimal(self):
+        return Decimal(self.minor).scaleb(-2)
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money(self.minor + other.minor)
+        return NotImplemented
+
+    def __radd__(self, other):
+        # Lets the builtin sum() start from 0.
+        if other == 0:
+            return self
+        return NotImplemented
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money(self.minor - other.minor)
+        return NotImplemented
+
+    def __neg__(self):
+        return Money(-self.minor)
+
+    def __abs__(self):
+        return Money(abs(self.minor))
+
+    def __bool__(self):
+        return self.minor != 0
+
+    def __eq__(self, other):
+        if isinstance(other, Money):
+            return self.minor == other.minor
+        return NotImplemented
+
+    def __lt__(self, other):
+        if isinstance(other, Money):
+            return self.minor < other.minor
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.minor)
+
+    def __str__(self):
+        if self.minor < 0:
+            return "-%d.%02d" % divmod(-self.minor, MINOR_UNITS)
+        return "%d.%02d" % divmod(self.minor, MINOR_UNITS)
+
+    def __repr__(self):
+        return f"Money({self})"
+
+
+class MoneyJSONEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        if isinstance(o, Money):
+            return str(o)
+        return super().default(o)
+
+
+class MoneyFormField(forms.DecimalField):
+    """Validates amounts as Decimal; the model field turns them into Money."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("max_digits", 10)
+        kwargs.setdefault("decimal_places", 2)
+        super().__init__(**kwargs)
+
+    def prepare_value(self, value):
+        if isinstance(value, Money):
+            return value.to_decimal()
+        return super().prepare_value(value)
+
+    def has_changed(self, initial, data):
+        # The initial value is the model's Money; compare it as the Decimal
+        # that to_python() makes of the submitted data.
+        if isinstance(initial, Money):
+            initial = initial.to_decimal()
+        return super().has_changed(initial, data)
+
+
+class MoneyDescriptor(DeferredAttribute):
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = self.field.to_python(value)
+
+
+class MoneyField(models.BigIntegerField):
+    """Stores Money as a BIGINT of minor units.
+
+    Plain ints are taken as minor units; Decimal, str and float as major units.
+    """
+
+    descriptor_class = MoneyDescriptor
+
+    @cached_property
+    def validators(self):
+        # Skip IntegerField's range validators, which can't compare Money to int.
+        return [*self.default_validators, *self._validators]
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Money):
+            return value
+        if isinstance(value, int):
+            return Money(value)
+        try:
+            return Money.from_decimal(str(value))
+        except ValueError:
+            raise ValidationError(self.error_messages["invalid"], code="invalid", params={"value": value})
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return Money(int(value))
+
+    def get_prep_value(self, value):
+        value = self.to_python(value)
+        if value is None:
+            return None
+        return value.minor
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        # Major units, as to_python() reads strings, so fixtures round-trip.
+        return "" if value is None else str(value)
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **{"form_class": MoneyFormField, **kwargs})
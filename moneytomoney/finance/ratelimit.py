@@ -0,0 +1,146 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.http import HttpResponse
+
+# RATE_LIMITS maps URL names to rules, e.g.
+#     'download_annual_report': {'per_minute': 6, 'burst': 3, 'max_in_flight': 1}
+#     'dashboard': {'per_minute': 30, 'burst': 10, 'param': 'search'}
+# ``param`` limits only requests carrying that GET parameter and
+# ``max_in_flight`` is enforced by ConcurrencyLimitMixin on the view itself.
+
+
+def rate_limits():
+    return getattr(settings, "RATE_LIMITS", {})
+
+
+def _client_key(request):
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def _increment(key, timeout):
+    """Atomically add one to the counter at ``key``, creating it if needed; return the new value."""
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Expired or evicted between add() and incr().
+        cache.add(key, 1, timeout)
+        return 1
+
+
+# GCRA (the token bucket expressed as one "theoretical arrival time" per key),
+# run inside Redis so the read-modify-write is atomic across workers. Times
+# travel as strings: Lua numbers in replies are truncated to integers.
+_GCRA_SCRIPT = """
+local now, interval, burst = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or ARGV[1]), now) + interval
+local wait = tat - now - burst * interval
+if wait > 0 then
+    return tostring(wait)
+end
+redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil((tat - now) * 1000))
+return '0'
+"""
+
+# Serializes the same update for process-local caches such as LocMem.
+_bucket_lock = threading.Lock()
+
+
+def take_token(key, per_minute, burst):
+    """Take one token from the bucket at ``key``; return 0 if allowed or the seconds to wait.
+
+    The bucket holds ``burst`` tokens and refills at ``per_minute``. It is kept
+    as GCRA: one timestamp per key, the time at which the bucket would be full
+    again, so any ``burst * 60 / per_minute`` seconds admit at most ``burst``
+    requests plus the refill, with no window edges to straddle. On Redis the
+    update is one Lua script; other caches update it under a process lock,
+    which is exact for LocMem since that cache is per process too.
+    """
+    now = time.time()
+    interval = 60 / per_minute
+    if isinstance(cache, RedisCache):
+        client = cache._cache.get_client(key, write=True)
+        return float(client.eval(_GCRA_SCRIPT, 1, cache.make_and_validate_key(key), now, interval, burst))
+    with _bucket_lock:
+        tat = max(cache.get(key, now), now) + interval
+        wait = tat - now - burst * interval
+        if wait > 0:
+            return wait
+        cache.set(key, tat, math.ceil(tat - now))
+        return 0
+
+
+def rejected_count(url_name):
+    return cache.get(f"ratelimit:rejected:{url_name}", 0)
+
+
+def too_many_requests(url_name, retry_after):
+    try:
+        cache.incr(f"ratelimit:rejected:{url_name}")
+    except ValueError:
+        cache.add(f"ratelimit:rejected:{url_name}", 1, None)
+
+    response = HttpResponse("Too many requests, please try again shortly.", status=429, content_type="text/plain")
+    response["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+class RateLimitMiddleware:
+    """Token-bucket (GCRA) limiter per URL name and per user (or client IP), configured by RATE_LIMITS."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        url_name = request.resolver_match.url_name
+        rule = rate_limits().get(url_name)
+        if not rule or "per_minute" not in rule:
+            return None
+        if "param" in rule and not request.GET.get(rule["param"]):
+            return None
+
+        key = f"ratelimit:bucket:{url_name}:{_client_key(request)}"
+        retry_after = take_token(key, rule["per_minute"], rule.get("burst", 1))
+        if retry_after:
+            return too_many_requests(url_name, retry_after)
+        return None
+
+
+class ConcurrencyLimitMixin:
+    """Caps how many requests per user may run the view at once (RATE_LIMITS ``max_in_flight``)."""
+
+    # Safety net so a crashed worker cannot leave a user locked out forever.
+    in_flight_timeout = 300
+
+    def dispatch(self, request, *args, **kwargs):
+        url_name = request.resolver_match.url_name
+        limit = rate_limits().get(url_name, {}).get("max_in_flight")
+        if not limit:
+            return super().dispatch(request, *args, **kwargs)
+
+        key = f"ratelimit:inflight:{url_name}:{_client_key(request)}"
+        if _increment(key, self.in_flight_timeout) > limit:
+            self._release(key)
+            return too_many_requests(url_name, 1)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            self._release(key)
+
+    @staticmethod
+    def _release(key):
+        try:
+            cache.decr(key)
+        except ValueError:
+            # The counter expired or was evicted mid-request; nothing to release.
+            pass
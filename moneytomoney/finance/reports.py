@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from .analytics import annual_report_rows, tag_cooccurrence, tag_monthly_spend
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def annual_report_data(user, year):
+    """Everything the annual report shows for ``year``; plain values, so it can be stored as a snapshot."""
+    rows, totals = annual_report_rows(user, year)
+    return {
+        "rows": rows,
+        "totals": totals,
+        "tag_spend": tag_monthly_spend(user, year),
+        "tag_pairs": tag_cooccurrence(user, year)["pairs"],
+    }
+
+
+def annual_report_workbook(data, year):
+    """Build the premium annual report for ``year`` from annual_report_data() as an openpyxl Workbook."""
+    # openpyxl takes longer to import than the rest of the app; only workers
+    # that actually serve a report pay for it.
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Annual Summary"
+
+    ws.append(["Month", "Category", "Total Income", "Total Expense", "Net Balance"])
+
+    total_income_year, total_expense_year, net_year = data["totals"]
+    for month_name, cat_name, total_income, total_expense, net in data["rows"]:
+        ws.append([month_name, cat_name, total_income.to_decimal(), total_expense.to_decimal(), net.to_decimal()])
+
+    ws.append(["", "", "", "", ""])
+    ws.append(["Total", "", total_income_year.to_decimal(), total_expense_year.to_decimal(), net_year.to_decimal()])
+
+    ws_tags = wb.create_sheet("Tag Spend")
+    ws_tags.append(["Tag"] + [datetime(year, m, 1).strftime("%B") for m in range(1, 13)] + ["Total"])
+    for name, months, total in data["tag_spend"]:
+        ws_tags.append([name] + [value.to_decimal() for value in months] + [total.to_decimal()])
+
+    ws_pairs = wb.create_sheet("Tag Pairs")
+    ws_pairs.append(["Tag", "Tag", "Transactions Together"])
+    for first, second, count in data["tag_pairs"]:
+        ws_pairs.append([first, second, count])
+
+    return wb
@@ -0,0 +1,76 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Set by ReplicaRoutingMiddleware for the duration of a read-only request.
+_read_from_replica = ContextVar("read_from_replica", default=False)
+
+PIN_COOKIE = "pin_primary"
+
+# Sessions and auth are read on every request; a lagging copy could log users out.
+PRIMARY_ONLY_APPS = {"sessions", "auth", "contenttypes"}
+
+
+def replica_alias():
+    alias = getattr(settings, "REPLICA_DATABASE", "replica")
+    return alias if alias in settings.DATABASES else None
+
+
+class PrimaryReplicaRouter:
+    """Sends reads of whitelisted views to the replica and everything else to ``default``."""
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if _read_from_replica.get() and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            return replica_alias() or "default"
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives its schema through replication.
+        return db != replica_alias()
+
+
+class ReplicaRoutingMiddleware:
+    """Routes REPLICA_READ_VIEWS to the replica unless the client wrote recently.
+
+    Any unsafe request sets a short-lived cookie that pins that browser to the
+    primary for REPLICA_PIN_SECONDS, so users always see their own writes even
+    while the replica lags.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request._replica_token = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if request._replica_token is not None:
+                _read_from_replica.reset(request._replica_token)
+
+        if request.method not in ("GET", "HEAD", "OPTIONS", "TRACE"):
+            response.set_cookie(
+                PIN_COOKIE, "1",
+                max_age=getattr(settings, "REPLICA_PIN_SECONDS", 10),
+                httponly=True, samesite="Lax",
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in ("GET", "HEAD")
+            and replica_alias()
+            and PIN_COOKIE not in request.COOKIES
+            and request.resolver_match.url_name in getattr(settings, "REPLICA_READ_VIEWS", ())
+        ):
+            request._replica_token = _read_from_replica.set(True)
+        return None
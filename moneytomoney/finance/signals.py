@@ -0,0 +1,117 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from .events import publish_change
+from .ledger import apply_delta, signed_amount
+from .models import Budget, Category, Expense, Income, Tag
+from .sync import in_bulk_changes, record_deletion, touch, touch_owners
+from . import typeahead
+
+
+def _handled_elsewhere(origin):
+    # Rows removed together with their user need no tombstone or touch, and
+    # batch jobs inside bulk_changes() record their deletes themselves.
+    return isinstance(origin, User) or in_bulk_changes()
+
+
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Income)
+@receiver(post_delete, sender=Budget)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Category)
+def write_tombstone(sender, instance, origin=None, **kwargs):
+    if not _handled_elsewhere(origin):
+        record_deletion(instance)
+
+
+@receiver(pre_delete, sender=Category)
+def touch_categorized(sender, instance, origin=None, **kwargs):
+    # The SET_NULL cascade updates these rows without calling save().
+    if not _handled_elsewhere(origin):
+        touch_owners(Expense.objects.filter(category=instance))
+        touch_owners(Income.objects.filter(category=instance))
+
+
+@receiver(pre_delete, sender=Tag)
+def touch_tagged(sender, instance, origin=None, **kwargs):
+    if not _handled_elsewhere(origin):
+        touch_owners(Expense.objects.filter(tags=instance))
+        touch_owners(Income.objects.filter(tags=instance))
+
+
+@receiver(m2m_changed, sender=Expense.tags.through)
+@receiver(m2m_changed, sender=Income.tags.through)
+def touch_retagged(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        # A row saved earlier in this transaction already has a fresh sequence
+        # number, and clients cannot see it before the new links commit.
+        if not getattr(instance, "_saved_this_transaction", False):
+            touch(type(instance).objects.filter(pk=instance.pk), instance.user_id)
+    elif pk_set:
+        touch(model.objects.filter(pk__in=pk_set, user_id=instance.user_id), instance.user_id)
+
+
+@receiver(post_init, sender=Expense)
+@receiver(post_init, sender=Income)
+def remember_ledger_entry(sender, instance, **kwargs):
+    # Only rows loaded from the database have an entry to undo. Read __dict__
+    # directly so deferred fields are not fetched just for this.
+    loaded = instance.pk is not None and "amount" in instance.__dict__ and "date" in instance.__dict__
+    instance._ledger_entry = (instance.date, signed_amount(instance)) if loaded else None
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Income)
+def update_checkpoints_on_save(sender, instance, created, **kwargs):
+    old = None if created else instance._ledger_entry
+    new = (instance.date, signed_amount(instance))
+    instance._previous_ledger_entry = old
+    if old == new:
+        return
+    if old is not None and old[0].replace(day=1) == new[0].replace(day=1):
+        apply_delta(instance.user_id, new[0], new[1] - old[1])
+    else:
+        if old is not None:
+            apply_delta(instance.user_id, old[0], -old[1])
+        apply_delta(instance.user_id, new[0], new[1])
+    instance._ledger_entry = new
+
+
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Income)
+def update_checkpoints_on_delete(sender, instance, origin=None, **kwargs):
+    if not _handled_elsewhere(origin):
+        apply_delta(instance.user_id, instance.date, -signed_amount(instance))
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Income)
+@receiver(post_save, sender=Budget)
+def publish_saved(sender, instance, created, **kwargs):
+    if sender is Budget:
+        months = [instance.month]
+    else:
+        # A changed date can move the row out of another month's dashboard.
+        previous = None if created else getattr(instance, "_previous_ledger_entry", None)
+        months = [instance.date] + ([previous[0]] if previous else [])
+    publish_change(instance, "added" if created else "changed", months)
+
+
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Income)
+@receiver(post_delete, sender=Budget)
+def publish_deleted(sender, instance, origin=None, **kwargs):
+    if not _handled_elsewhere(origin):
+        publish_change(instance, "deleted", [instance.month if sender is Budget else instance.date])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Category)
+def invalidate_typeahead(sender, instance, origin=None, **kwargs):
+    if not _handled_elsewhere(origin):
+        typeahead.invalidate(instance.user_id)
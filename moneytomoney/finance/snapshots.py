@@ -0,0 +1,47 @@
+from .models import ReportSnapshot
+from .money import Money
+
+
+def _encode(value):
+    if isinstance(value, Money):
+        return {"$money": value.minor}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if "$money" in value:
+            return Money(value["$money"])
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+
+def load_snapshot(user, kind, year, version):
+    """Stored data of ``kind`` for ``user``/``year``, or None unless it was computed at ``version``."""
+    data = (
+        ReportSnapshot.objects.filter(user=user, kind=kind, year=year, version=version)
+        .values_list("data", flat=True)
+        .first()
+    )
+    return None if data is None else _decode(data)
+
+
+def snapshot(user_id, kind, year, version, data):
+    """An unsaved ReportSnapshot, for store_snapshots()."""
+    return ReportSnapshot(user_id=user_id, kind=kind, year=year, version=version, data=_encode(data))
+
+
+def store_snapshots(snapshots):
+    """Insert or replace ``snapshots`` with one INSERT ... ON CONFLICT."""
+    ReportSnapshot.objects.bulk_create(
+        snapshots,
+        update_conflicts=True,
+        unique_fields=["user", "kind", "year"],
+        update_fields=["version", "data", "computed_at"],
+    )
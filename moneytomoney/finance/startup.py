@@ -0,0 +1,68 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from django.conf import settings
+
+# Modules that must not be imported before a request actually needs them.
+LAZY_MODULES = ["openpyxl"]
+
+# Runs in a fresh interpreter so nothing is already imported.
+_PROBE = """
+import json, sys, time
+from wsgiref.util import setup_testing_defaults
+
+started = time.perf_counter()
+from moneytomoney.wsgi import application
+imported = time.perf_counter()
+
+environ = {"PATH_INFO": %(path)r}
+setup_testing_defaults(environ)
+status = []
+body = application(environ, lambda s, headers, exc_info=None: status.append(s))
+b"".join(body)
+finished = time.perf_counter()
+
+print(json.dumps({
+    "import_seconds": imported - started,
+    "first_request_seconds": finished - imported,
+    "status": status[0],
+    "lazy_modules_loaded": [name for name in %(lazy)r if name in sys.modules],
+}))
+"""
+
+
+def measure_startup(path="/login/", import_profile=False):
+    """Start a fresh Python process, import the WSGI app and serve one GET of ``path``.
+
+    Returns the timings reported by the child. With ``import_profile`` the
+    child runs under ``-X importtime`` and the raw report is included as
+    ``import_profile``.
+    """
+    command = [sys.executable]
+    if import_profile:
+        command += ["-X", "importtime"]
+    command += ["-c", _PROBE % {"path": path, "lazy": LAZY_MODULES}]
+
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "moneytomoney.settings")}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(settings.BASE_DIR), env.get("PYTHONPATH")]))
+    result = subprocess.run(command, capture_output=True, text=True, cwd=Path(settings.BASE_DIR), env=env, check=True)
+
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    if import_profile:
+        timings["import_profile"] = result.stderr
+    return timings
+
+
+def slowest_imports(import_profile, limit=15):
+    """Parse ``-X importtime`` output into ``(cumulative_us, module)`` pairs, slowest first."""
+    rows = []
+    for line in import_profile.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self, cumulative, module = line.removeprefix("import time:").split("|")
+        rows.append((int(cumulative), module.strip()))
+    rows.sort(reverse=True)
+    return rows[:limit]
@@ -0,0 +1,164 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from heapq import merge
+
+from django.db import transaction
+from django.db.models import F, Max, Min
+from django.utils import timezone
+
+from .models import Budget, Category, ChangeCounter, Expense, Income, Tag, Tombstone
+
+SYNC_PAGE_SIZE = 100
+SYNC_MAX_PAGE_SIZE = 500
+
+_bulk_changes = ContextVar("bulk_changes", default=False)
+
+# model name -> (model, fields sent to clients)
+SYNCED = {
+    "category": (Category, ["id", "name"]),
+    "tag": (Tag, ["id", "name"]),
+    "expense": (Expense, ["id", "title", "amount", "date", "category_id", "payment_method_id"]),
+    "income": (Income, ["id", "source", "amount", "date", "category_id"]),
+    "budget": (Budget, ["id", "month", "amount"]),
+}
+
+
+def sync_name(model):
+    return model._meta.model_name
+
+
+def ledger_version(user):
+    """Latest change sequence number of ``user``; changes whenever any of their rows does."""
+    return ChangeCounter.objects.filter(user=user).values_list("value", flat=True).first() or 0
+
+
+def touch(queryset, user_id, **changes):
+    """Bump ``change_seq``/``updated_at`` of every row in ``queryset`` with one UPDATE.
+
+    ``queryset`` must only contain rows of ``user_id``. Each row gets a unique
+    sequence number derived from its primary key, so a block the size of the
+    id range is reserved up front. Extra ``changes`` are applied in the same
+    statement.
+    """
+    with transaction.atomic():
+        bounds = queryset.aggregate(low=Min("pk"), high=Max("pk"))
+        if bounds["low"] is None:
+            return 0
+        start = ChangeCounter.reserve(user_id, bounds["high"] - bounds["low"] + 1)
+        return queryset.filter(pk__lte=bounds["high"]).update(
+            change_seq=F("pk") - bounds["low"] + start,
+            updated_at=timezone.now(),
+            **changes,
+        )
+
+
+def touch_owners(queryset, **changes):
+    """touch() the rows of ``queryset`` owner by owner, each with that user's counter.
+
+    For querysets that may reach other accounts' rows, e.g. legacy rows that
+    still point at a tag or category of another user.
+    """
+    owners = queryset.order_by().values_list("user_id", flat=True).distinct()
+    return sum(touch(queryset.filter(user_id=owner), owner, **changes) for owner in list(owners))
+
+
+def record_deletion(instance):
+    Tombstone.objects.create(
+        user_id=instance.user_id,
+        model=sync_name(type(instance)),
+        object_id=instance.pk,
+        change_seq=ChangeCounter.reserve(instance.user_id),
+    )
+
+
+def record_deletions(model, rows):
+    """Tombstones for deleted ``model`` rows given as ``(pk, user_id)``, in one INSERT.
+
+    One block of sequence numbers is reserved per user.
+    """
+    by_user = {}
+    for pk, user_id in rows:
+        by_user.setdefault(user_id, []).append(pk)
+    tombstones = []
+    for user_id, pks in by_user.items():
+        start = ChangeCounter.reserve(user_id, len(pks))
+        tombstones += [
+            Tombstone(user_id=user_id, model=sync_name(model), object_id=pk, change_seq=start + i)
+            for i, pk in enumerate(pks)
+        ]
+    Tombstone.objects.bulk_create(tombstones)
+
+
+@contextmanager
+def bulk_changes():
+    """Silence the per-row tombstone, touch, checkpoint and live-update signal handlers.
+
+    For batch jobs that delete through the ORM and then record the whole batch
+    themselves, e.g. with record_deletions() and one apply_delta() per month.
+    """
+    token = _bulk_changes.set(True)
+    try:
+        yield
+    finally:
+        _bulk_changes.reset(token)
+
+
+def in_bulk_changes():
+    return _bulk_changes.get()
+
+
+def _tag_ids(model, ids):
+    through = model.tags.through
+    fk_name = f"{sync_name(model)}_id"
+    tag_ids = {}
+    for obj_id, tag_id in through.objects.filter(**{f"{fk_name}__in": ids}).values_list(fk_name, "tag_id"):
+        tag_ids.setdefault(obj_id, []).append(tag_id)
+    return tag_ids
+
+
+def _changed(user, since, limit):
+    for name, (model, fields) in SYNCED.items():
+        rows = list(
+            model.objects.filter(user=user, change_seq__gt=since)
+            .order_by("change_seq")
+            .values("change_seq", "updated_at", *fields)[:limit + 1]
+        )
+        if model in (Expense, Income) and rows:
+            tag_ids = _tag_ids(model, [row["id"] for row in rows])
+            for row in rows:
+                row["tag_ids"] = tag_ids.get(row["id"], [])
+        yield [
+            (row.pop("change_seq"), {"op": "upsert", "model": name, "data": row})
+            for row in rows
+        ]
+
+    tombstones = (
+        Tombstone.objects.filter(user=user, change_seq__gt=since)
+        .order_by("change_seq")
+        .values_list("change_seq", "model", "object_id")[:limit + 1]
+    )
+    yield [
+        (seq, {"op": "delete", "model": name, "id": object_id})
+        for seq, name, object_id in tombstones
+    ]
+
+
+def sync_page(user, since=0, limit=SYNC_PAGE_SIZE):
+    """Return the next page of ``user``'s changes after sequence number ``since``.
+
+    Every table is read through its ``(user, change_seq)`` index for at most
+    ``limit + 1`` rows, and the per-table pages are merged by sequence number;
+    the extra row tells whether any table has more.
+    Sequence numbers are unique per user, so ``next`` can be handed back as
+    ``since`` without skipping or repeating rows.
+    """
+    limit = max(1, min(limit, SYNC_MAX_PAGE_SIZE))
+    changes = list(merge(*_changed(user, since, limit), key=lambda change: change[0]))
+    page = changes[:limit]
+    for seq, change in page:
+        change["seq"] = seq
+    return {
+        "changes": [change for _seq, change in page],
+        "next": str(page[-1][0] if page else since),
+        "more": len(changes) > limit,
+    }
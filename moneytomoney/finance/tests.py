@@ -1,3 +1,963 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission, User
+from django.core.management import call_command
+from django.core import serializers
+from django.core.cache import caches
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .admin import EstimatedCountPaginator
+from .events import InProcessBus
+from .export import EXPORT_COLUMNS
+from .management.commands.bench_session_writes import session_writes
+from .forms import BudgetPlanForm, ExpenseForm
+from .ledger import MAX_NEW_CHECKPOINTS, balance_as_of, month_balances
+from .merge import merge_categories, merge_tags
+from .models import (
+    AccountPurge, BalanceCheckpoint, Budget, Category, Expense, Income, PaymentMethod, ReportSnapshot, Tag, Tombstone,
+)
+from .money import Money
+from .ratelimit import rejected_count, take_token
+from .reports import annual_report_data
+from .routers import PIN_COOKIE
+from .snapshots import load_snapshot, snapshot, store_snapshots
+from .startup import measure_startup
+from . import typeahead
+from .sync import ledger_version, sync_page
+
+
+class StartupBudgetTests(SimpleTestCase):
+    """A fresh worker must come up within STARTUP_BUDGET."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Best of three, so one slow run on a busy machine does not fail the suite.
+        runs = [measure_startup() for _ in range(3)]
+        cls.import_seconds = min(run["import_seconds"] for run in runs)
+        cls.first_request_seconds = min(run["first_request_seconds"] for run in runs)
+        cls.lazy_modules_loaded = runs[0]["lazy_modules_loaded"]
+        cls.status = runs[0]["status"]
+
+    def test_first_request_succeeds(self):
+        self.assertEqual(self.status, "200 OK")
+
+    def test_import_within_budget(self):
+        self.assertLessEqual(self.import_seconds, settings.STARTUP_BUDGET["import_seconds"])
+
+    def test_first_request_within_budget(self):
+        self.assertLessEqual(self.first_request_seconds, settings.STARTUP_BUDGET["first_request_seconds"])
+
+    def test_heavy_modules_load_lazily(self):
+        self.assertEqual(self.lazy_modules_loaded, [])
+
+
+# --- Query and latency budgets -------------------------------------------
+#
+# Every view is requested against a generated ledger and must stay within a
+# fixed number of SQL queries; QueryScalingTests also checks that the count is
+# the same for a tiny and a much larger ledger, which catches N+1 lookups.
+# Wall-time budgets are only enforced when FINANCE_PERF_WALL_TIME is set,
+# e.g. FINANCE_PERF_WALL_TIME=1 (or 2 to double every budget on a slow box).
+# The tests share no state beyond their own database, so they can run with
+# `manage.py test finance --parallel auto`.
+
+FIXTURE_YEAR = 2024
+
+
+def make_ledger(user, per_month, tag_count):
+    """Give ``user`` ``per_month`` expenses and incomes in every month of FIXTURE_YEAR, two tags each."""
+    payment_method = PaymentMethod.objects.create(method="QR")
+    categories = Category.objects.bulk_create([Category(user=user, name=f"Category {i}") for i in range(4)])
+    tags = Tag.objects.bulk_create([Tag(user=user, name=f"Tag {i}") for i in range(tag_count)])
+    expenses = Expense.objects.bulk_create([
+        Expense(
+            user=user, title=f"Expense {month}-{i}", amount=Money(1000 + i), date=date(FIXTURE_YEAR, month, 1 + i % 28),
+            category=categories[(month + i) % len(categories)], payment_method=payment_method,
+        )
+        for month in range(1, 13) for i in range(per_month)
+    ])
+    incomes = Income.objects.bulk_create([
+        Income(
+            user=user, source=f"Income {month}-{i}", amount=Money(5000 + i), date=date(FIXTURE_YEAR, month, 1 + i % 28),
+            category=categories[(month + i) % len(categories)],
+        )
+        for month in range(1, 13) for i in range(per_month)
+    ])
+    Expense.tags.through.objects.bulk_create([
+        Expense.tags.through(expense_id=expense.pk, tag_id=tags[(n + k) % tag_count].pk)
+        for n, expense in enumerate(expenses) for k in (0, 1)
+    ])
+    Income.tags.through.objects.bulk_create([
+        Income.tags.through(income_id=income.pk, tag_id=tags[(n + k) % tag_count].pk)
+        for n, income in enumerate(incomes) for k in (0, 1)
+    ])
+    Budget.objects.bulk_create([Budget(user=user, month=date(FIXTURE_YEAR, month, 1), amount=Money(100000)) for month in range(1, 13)])
+    return {
+        "payment_method": payment_method,
+        "category": categories[0],
+        "other_category": categories[1],
+        "tag": tags[0],
+        "other_tag": tags[1],
+        "expense": expenses[0],
+        "income": incomes[0],
+    }
+
+
+def make_user(username):
+    user = User.objects.create_user(username, password="password")
+    user.user_permissions.set(Permission.objects.filter(content_type__app_label="finance"))
+    user.groups.add(Group.objects.get_or_create(name="premium")[0])
+    return user
+
+
+def view_requests(ledger):
+    """``(name, method, url, data)`` for every page the budgets cover."""
+    month = f"?month={FIXTURE_YEAR}-03"
+    expense, income = ledger["expense"], ledger["income"]
+    transaction = {"amount": "12.34", "date": f"{FIXTURE_YEAR}-03-05", "tag_names": "new tag"}
+    return [
+        ("home", "get", reverse("home"), None),
+        ("home_chart", "get", reverse("home_chart") + f"?year={FIXTURE_YEAR}", None),
+        ("dashboard", "get", reverse("dashboard") + month, None),
+        # Each search matches rows in every fixture, so the tag prefetch always runs.
+        *[
+            (f"dashboard_{a_filter}", "get", reverse("dashboard") + f"{month}&search={search}&a_filter={a_filter}", None)
+            for a_filter, search in (("title", "e"), ("tags", "tag"), ("categories", "category"), ("payment_method", "qr"))
+        ],
+        ("download_annual_report", "get", reverse("download_annual_report"), None),
+        ("expense_create_form", "get", reverse("expense_create"), None),
+        ("expense_create", "post", reverse("expense_create"), {
+            **transaction, "title": "Lunch", "payment_method": ledger["payment_method"].pk,
+            "category": ledger["category"].pk, "tags": [ledger["tag"].pk],
+        }),
+        ("expense_update_form", "get", reverse("expense_update", args=[expense.pk]), None),
+        ("expense_update", "post", reverse("expense_update", args=[expense.pk]), {
+            **transaction, "title": "Dinner", "payment_method": ledger["payment_method"].pk, "tags": [ledger["tag"].pk],
+        }),
+        ("expense_delete", "get", reverse("expense_delete", args=[expense.pk]), None),
+        ("income_create_form", "get", reverse("income_create"), None),
+        ("income_create", "post", reverse("income_create"), {**transaction, "source": "Bonus", "tags": [ledger["tag"].pk]}),
+        ("income_update_form", "get", reverse("income_update", args=[income.pk]), None),
+        ("income_update", "post", reverse("income_update", args=[income.pk]), {**transaction, "source": "Salary"}),
+        ("income_delete", "get", reverse("income_delete", args=[income.pk]), None),
+        ("budget_form", "get", reverse("budget_create"), None),
+        ("budget", "post", reverse("budget_create"), {"month": f"{FIXTURE_YEAR}-03", "amount": "500"}),
+        ("tag_list", "get", reverse("tag_create"), None),
+        ("tag_create", "post", reverse("tag_create"), {"name": "Groceries"}),
+        ("tag_update", "post", reverse("tag_update", args=[ledger["tag"].pk]), {"name": "Renamed"}),
+        ("tag_merge_form", "get", reverse("tag_merge"), None),
+        ("tag_merge", "post", reverse("tag_merge"), {"sources": [ledger["other_tag"].pk], "target": ledger["tag"].pk}),
+        ("tag_delete", "get", reverse("tag_delete", args=[ledger["tag"].pk]), None),
+        ("category_list", "get", reverse("category_create"), None),
+        ("category_create", "post", reverse("category_create"), {"name": "Travel"}),
+        ("category_update", "post", reverse("category_update", args=[ledger["category"].pk]), {"name": "Renamed"}),
+        ("category_merge_form", "get", reverse("category_merge"), None),
+        ("category_merge", "post", reverse("category_merge"), {
+            "sources": [ledger["other_category"].pk], "target": ledger["category"].pk,
+        }),
+        ("category_delete", "get", reverse("category_delete", args=[ledger["category"].pk]), None),
+    ]
+
+
+# Upper bound on queries per page, including session, user and permission
+# lookups and transaction statements. Writes also pay for sync sequence
+# numbers, tombstones and balance checkpoints.
+QUERY_BUDGETS = {
+    "home": 3,
+    "home_chart": 6,
+    "dashboard": 25,
+    "dashboard_title": 12,
+    "dashboard_tags": 12,
+    "dashboard_categories": 12,
+    "dashboard_payment_method": 10,
+    "download_annual_report": 12,
+    "expense_create_form": 8,
+    "expense_create": 32,
+    "expense_update_form": 11,
+    "expense_update": 33,
+    "expense_delete": 16,
+    "income_create_form": 7,
+    "income_create": 28,
+    "income_update_form": 10,
+    "income_update": 30,
+    "income_delete": 16,
+    "budget_form": 4,
+    "budget": 11,
+    "tag_list": 5,
+    "tag_create": 12,
+    "tag_update": 14,
+    "tag_merge_form": 6,
+    "tag_merge": 40,
+    "tag_delete": 32,
+    "category_list": 5,
+    "category_create": 12,
+    "category_update": 14,
+    "category_merge_form": 6,
+    "category_merge": 36,
+    "category_delete": 32,
+}
+
+# Milliseconds per page, enforced only with FINANCE_PERF_WALL_TIME.
+WALL_TIME_BUDGETS = {
+    "download_annual_report": 500,
+}
+DEFAULT_WALL_TIME_BUDGET = 250
+
+
+def clear_caches():
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+@override_settings(RATE_LIMITS={})
+class ViewBudgetTestCase(TestCase):
+    def setUp(self):
+        # Chart data and dashboard rows are cached across requests.
+        clear_caches()
+
+    def run_request(self, user, method, url, data):
+        """Issue one request as ``user``; return ``(response, queries, milliseconds)``."""
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(self.client, method)(url, data)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            elapsed = (time.perf_counter() - started) * 1000
+        self.assertLess(response.status_code, 400, f"{method.upper()} {url}")
+        return response, len(queries), elapsed
+
+
+class QueryBudgetTests(ViewBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("budgeted")
+        cls.ledger = make_ledger(cls.user, per_month=10, tag_count=8)
+
+    def test_views_within_query_budget(self):
+        for name, method, url, data in view_requests(self.ledger):
+            with self.subTest(view=name):
+                _response, queries, _elapsed = self.run_request(self.user, method, url, data)
+                self.assertLessEqual(queries, QUERY_BUDGETS[name], f"{name} ran {queries} queries")
+
+    def test_views_within_wall_time_budget(self):
+        scale = float(os.environ.get("FINANCE_PERF_WALL_TIME") or 0)
+        if not scale:
+            self.skipTest("Set FINANCE_PERF_WALL_TIME to enforce wall-time budgets.")
+        for name, method, url, data in view_requests(self.ledger):
+            with self.subTest(view=name):
+                _response, _queries, elapsed = self.run_request(self.user, method, url, data)
+                budget = WALL_TIME_BUDGETS.get(name, DEFAULT_WALL_TIME_BUDGET) * scale
+                self.assertLessEqual(elapsed, budget, f"{name} took {elapsed:.0f} ms")
+
+
+class QueryScalingTests(ViewBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.small_user = make_user("small")
+        cls.small_ledger = make_ledger(cls.small_user, per_month=1, tag_count=3)
+        cls.large_user = make_user("large")
+        cls.large_ledger = make_ledger(cls.large_user, per_month=40, tag_count=30)
+
+    def test_query_count_does_not_grow_with_ledger(self):
+        small = view_requests(self.small_ledger)
+        large = view_requests(self.large_ledger)
+        for (name, *small_request), (_name, *large_request) in zip(small, large):
+            with self.subTest(view=name):
+                clear_caches()
+                _response, small_queries, _elapsed = self.run_request(self.small_user, *small_request)
+                clear_caches()
+                _response, large_queries, _elapsed = self.run_request(self.large_user, *large_request)
+                self.assertEqual(small_queries, large_queries)
+
+
+# --- Behavior ---------------------------------------------------------------
+#
+# The fixtures above use bulk_create and skip save(); the tests below go
+# through the ORM and the views so sequence numbers, tombstones, checkpoints
+# and fingerprints are maintained as in production.
+
+def make_expense(user, amount, day, title="Expense", **fields):
+    fields.setdefault("payment_method", PaymentMethod.objects.get_or_create(method="Cash")[0])
+    return Expense.objects.create(user=user, title=title, amount=Money(amount), date=day, **fields)
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        self.user = make_user("syncer")
+
+    def test_more_is_set_when_a_single_table_is_truncated(self):
+        for i in range(5):
+            make_expense(self.user, 100 + i, date(FIXTURE_YEAR, 1, 1 + i))
+        page = sync_page(self.user, limit=3)
+        self.assertEqual(len(page["changes"]), 3)
+        self.assertTrue(page["more"])
+
+        rest = sync_page(self.user, since=int(page["next"]), limit=3)
+        self.assertEqual(len(rest["changes"]), 2)
+        self.assertFalse(rest["more"])
+
+    def test_paging_returns_every_change_exactly_once(self):
+        category = Category.objects.create(user=self.user, name="Food")
+        tag = Tag.objects.create(user=self.user, name="Lunch")
+        for i in range(4):
+            make_expense(self.user, 100 + i, date(FIXTURE_YEAR, 1, 1 + i), category=category).tags.add(tag)
+            Income.objects.create(user=self.user, source=f"Income {i}", amount=Money(500), date=date(FIXTURE_YEAR, 1, 1))
+        Expense.objects.filter(user=self.user).first().delete()
+
+        seen, since, more = [], 0, True
+        while more:
+            page = sync_page(self.user, since=since, limit=2)
+            seen += [change["seq"] for change in page["changes"]]
+            since, more = int(page["next"]), page["more"]
+        self.assertEqual(seen, sorted(set(seen)))
+        self.assertEqual(len(seen), len(sync_page(self.user, limit=500)["changes"]))
+
+    def test_deleted_rows_are_sent_as_tombstones(self):
+        expense = make_expense(self.user, 100, date(FIXTURE_YEAR, 1, 1))
+        since = int(sync_page(self.user)["next"])
+        expense_id = expense.pk
+        expense.delete()
+
+        changes = sync_page(self.user, since=since)["changes"]
+        self.assertEqual(
+            [(change["op"], change["model"], change["id"]) for change in changes],
+            [("delete", "expense", expense_id)],
+        )
+        self.assertFalse(Tombstone.objects.filter(user=self.user).exclude(object_id=expense_id).exists())
+
+    def test_deleting_a_tag_resends_its_rows(self):
+        tag = Tag.objects.create(user=self.user, name="Lunch")
+        expense = make_expense(self.user, 100, date(FIXTURE_YEAR, 1, 1))
+        expense.tags.add(tag)
+        since = int(sync_page(self.user)["next"])
+        tag_id = tag.pk
+        tag.delete()
+
+        changes = sync_page(self.user, since=since)["changes"]
+        self.assertEqual(
+            [(change["op"], change["model"]) for change in changes],
+            [("upsert", "expense"), ("delete", "tag")],
+        )
+        self.assertEqual(changes[0]["data"]["tag_ids"], [])
+        self.assertEqual(changes[1]["id"], tag_id)
+
+    def test_deleting_a_shared_category_bumps_each_row_with_its_owners_counter(self):
+        other = make_user("legacy")
+        category = Category.objects.create(user=self.user, name="Food")
+        for i in range(3):
+            make_expense(other, 100 + i, date(FIXTURE_YEAR, 1, 1 + i))
+        # A row from before categories were per user.
+        legacy = make_expense(other, 200, date(FIXTURE_YEAR, 1, 5), category=category)
+        since = int(sync_page(other)["next"])
+        category.delete()
+
+        changes = sync_page(other, since=since)["changes"]
+        self.assertEqual([(change["model"], change["data"]["id"]) for change in changes], [("expense", legacy.pk)])
+        self.assertIsNone(changes[0]["data"]["category_id"])
+
+    def test_saving_a_tagged_row_reserves_one_sequence_number(self):
+        tag = Tag.objects.create(user=self.user, name="Lunch")
+        payment_method = PaymentMethod.objects.create(method="CASH")
+        form = ExpenseForm({
+            "title": "Lunch", "amount": "12.50", "date": date(FIXTURE_YEAR, 1, 1),
+            "payment_method": payment_method.pk, "tags": [tag.pk],
+        }, user=self.user)
+        self.assertTrue(form.is_valid())
+        before = ledger_version(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            expense = form.save_unless_duplicate(user=self.user)
+        self.assertEqual(ledger_version(self.user), before + 1)
+        self.assertEqual(sync_page(self.user, since=before)["changes"][0]["data"]["tag_ids"], [tag.pk])
+
+        # Once committed, a later change of links is a change of its own.
+        expense.tags.clear()
+        self.assertEqual(ledger_version(self.user), before + 2)
+
+    def test_sync_endpoint_rejects_bad_cursor(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("sync"), {"since": "x"}).status_code, 400)
+
+
+class DashboardRowCacheTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = make_user("cached")
+        self.client.force_login(self.user)
+        self.payment_method = PaymentMethod.objects.create(method="QR")
+        make_expense(self.user, 100, date(FIXTURE_YEAR, 3, 1), payment_method=self.payment_method)
+        self.url = reverse("dashboard") + f"?month={FIXTURE_YEAR}-03"
+
+    def test_renaming_a_payment_method_refreshes_cached_rows(self):
+        self.assertContains(self.client.get(self.url), '<td class="px-4 py-3">QR</td>')
+        self.payment_method.method = "CREDIT"
+        self.payment_method.save()
+        self.assertContains(self.client.get(self.url), '<td class="px-4 py-3">CREDIT</td>')
+
+
+class YearValidationTests(TestCase):
+    def setUp(self):
+        self.client.force_login(make_user("years"))
+
+    def test_home_chart_rejects_years_out_of_range(self):
+        for year in ("0", "10000", "-1", "x"):
+            with self.subTest(year=year):
+                self.assertEqual(self.client.get(reverse("home_chart"), {"year": year}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("home_chart"), {"year": FIXTURE_YEAR}).status_code, 200)
+
+    def test_tag_analytics_rejects_years_out_of_range(self):
+        for year in ("0", "10000", "x"):
+            with self.subTest(year=year):
+                self.assertEqual(self.client.get(reverse("tag_analytics"), {"year": year}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("tag_analytics"), {"year": FIXTURE_YEAR}).status_code, 200)
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.user = make_user("ledger")
+
+    def recomputed(self, day):
+        """Balance of every transaction up to ``day``, summed without checkpoints."""
+        return (
+            Money.total(Income.objects.filter(user=self.user, date__lte=day).values_list("amount", flat=True))
+            - Money.total(Expense.objects.filter(user=self.user, date__lte=day).values_list("amount", flat=True))
+        )
+
+    def test_balances_follow_creates_updates_and_deletes(self):
+        Income.objects.create(user=self.user, source="Salary", amount=Money(10000), date=date(FIXTURE_YEAR, 1, 5))
+        make_expense(self.user, 2500, date(FIXTURE_YEAR, 2, 10))
+        self.assertEqual(month_balances(self.user, date(FIXTURE_YEAR, 4, 1)), (Money(7500), Money(7500)))
+
+        # Every write below lands before checkpoints that now exist.
+        moved = make_expense(self.user, 1000, date(FIXTURE_YEAR, 3, 1))
+        moved.date, moved.amount = date(FIXTURE_YEAR, 1, 20), Money(1200)
+        moved.save()
+        Expense.objects.filter(user=self.user, amount=Money(2500)).get().delete()
+
+        for day in (date(FIXTURE_YEAR, 1, 31), date(FIXTURE_YEAR, 2, 28), date(FIXTURE_YEAR, 3, 31)):
+            with self.subTest(day=day):
+                self.assertEqual(balance_as_of(self.user, day), self.recomputed(day))
+        self.assertEqual(month_balances(self.user, date(FIXTURE_YEAR, 4, 1))[0], Money(8800))
+
+    def test_one_call_stores_a_bounded_number_of_checkpoints(self):
+        make_expense(self.user, 100, date(1950, 1, 1))
+        self.assertEqual(balance_as_of(self.user, date(2100, 12, 31)), Money(-100))
+        self.assertEqual(BalanceCheckpoint.objects.filter(user=self.user).count(), MAX_NEW_CHECKPOINTS)
+
+    def test_dates_outside_the_year_range_are_rejected(self):
+        self.client.force_login(self.user)
+        make_expense(self.user, 100, date(FIXTURE_YEAR, 1, 1))
+        for month in ("9999-12", "0001-01"):
+            with self.subTest(month=month):
+                self.assertEqual(self.client.get(reverse("dashboard"), {"month": month}).status_code, 400)
+        for day in ("9999-12-31", "0001-01-01", "garbage", ""):
+            with self.subTest(day=day):
+                self.assertEqual(self.client.get(reverse("balance"), {"date": day}).status_code, 400)
+        self.assertFalse(BalanceCheckpoint.objects.filter(user=self.user).exists())
+        self.assertEqual(self.client.get(reverse("balance")).json()["balance"], "-1.00")
+
+
+class BudgetPlanTests(TestCase):
+    def setUp(self):
+        self.user = make_user("planner")
+        self.client.force_login(self.user)
+
+    def plan(self, **data):
+        return self.client.post(reverse("budget_plan_api"), json.dumps(data), content_type="application/json")
+
+    def test_form_rejects_long_and_out_of_range_spans(self):
+        for start, end in (("1900-01", "2100-12"), ("9999-01", "9999-12"), ("0001-01", "0001-02")):
+            with self.subTest(start=start, end=end):
+                form = BudgetPlanForm({"start_month": start, "end_month": end, "mode": "set", "amount": "10"})
+                self.assertFalse(form.is_valid())
+
+    def test_api_plans_budgets(self):
+        response = self.plan(start_month=f"{FIXTURE_YEAR}-01", end_month=f"{FIXTURE_YEAR}-03", amount="500.00")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Budget.objects.filter(user=self.user).count(), 3)
+
+    def test_api_rejects_unknown_modes(self):
+        for mode in ("delete", ["set"], None):
+            with self.subTest(mode=mode):
+                response = self.plan(start_month=f"{FIXTURE_YEAR}-01", end_month=f"{FIXTURE_YEAR}-03", mode=mode)
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Budget.objects.filter(user=self.user).exists())
+
+
+class DuplicateTransactionTests(TestCase):
+    def setUp(self):
+        self.user = make_user("duplicator")
+        self.payment_method = PaymentMethod.objects.create(method="CASH")
+        self.day = date(FIXTURE_YEAR, 5, 1)
+
+    def form(self, **data):
+        return ExpenseForm({
+            "title": "Lunch", "amount": "12.50", "date": self.day, "payment_method": self.payment_method.pk, **data,
+        }, user=self.user)
+
+    @override_settings(DUPLICATE_TRANSACTIONS="reject")
+    def test_a_copy_saved_after_the_check_is_rejected(self):
+        form = self.form()
+        self.assertTrue(form.is_valid())
+        make_expense(self.user, 1250, self.day, title="Lunch", payment_method=self.payment_method)
+
+        self.assertIsNone(form.save_unless_duplicate(user=self.user))
+        self.assertTrue(form.non_field_errors())
+        self.assertEqual(Expense.objects.filter(user=self.user).count(), 1)
+
+    @override_settings(DUPLICATE_TRANSACTIONS="warn")
+    def test_duplicates_the_user_keeps_are_saved(self):
+        self.assertTrue(self.form().save_unless_duplicate(user=self.user))
+        self.assertFalse(self.form().is_valid())
+        kept = self.form(allow_duplicate="on")
+        self.assertTrue(kept.is_valid())
+        self.assertTrue(kept.save_unless_duplicate(user=self.user).duplicate_allowed)
+
+    def test_dedupe_merges_tags_and_records_deletes_in_bulk(self):
+        Income.objects.create(user=self.user, source="Salary", amount=Money(10000), date=date(FIXTURE_YEAR, 1, 1))
+        balance_as_of(self.user, date(FIXTURE_YEAR, 12, 31))
+        lunch, dinner = Tag.objects.create(user=self.user, name="Lunch"), Tag.objects.create(user=self.user, name="Dinner")
+        keeper = make_expense(self.user, 1250, self.day, title="Lunch")
+        keeper.tags.add(lunch)
+        copies = [make_expense(self.user, 1250, self.day, title=" lunch ", legacy_duplicate=True) for _ in range(3)]
+        copies[0].tags.add(lunch, dinner)
+        kept = make_expense(self.user, 1250, self.day, title="Lunch", duplicate_allowed=True)
+        since = int(sync_page(self.user)["next"])
+
+        call_command("dedupe_transactions", stdout=StringIO())
+
+        self.assertEqual(list(Expense.objects.filter(user=self.user).order_by("pk")), [keeper, kept])
+        self.assertEqual(set(keeper.tags.all()), {lunch, dinner})
+        deleted = {change["id"] for change in sync_page(self.user, since=since)["changes"] if change["op"] == "delete"}
+        self.assertEqual(deleted, {copy.pk for copy in copies})
+        self.assertEqual(balance_as_of(self.user, date(FIXTURE_YEAR, 12, 31)), Money(10000 - 2 * 1250))
+
+
+class PurgeAccountTests(TestCase):
+    def test_purge_deletes_the_account_and_detaches_shared_rows(self):
+        leaving, staying = make_user("leaving"), make_user("staying")
+        category = Category.objects.create(user=leaving, name="Food")
+        tag = Tag.objects.create(user=leaving, name="Lunch")
+        for i in range(5):
+            make_expense(leaving, 100 + i, date(FIXTURE_YEAR, 1, 1 + i), category=category).tags.add(tag)
+        Income.objects.create(user=leaving, source="Salary", amount=Money(500), date=date(FIXTURE_YEAR, 1, 1))
+        balance_as_of(leaving, date(FIXTURE_YEAR, 2, 1))
+        # A row from before names were per user, pointing at the leaving account's tag and category.
+        legacy = make_expense(staying, 100, date(FIXTURE_YEAR, 1, 1), category=category)
+        legacy.tags.add(tag)
+        seq = Expense.objects.get(pk=legacy.pk).change_seq
+        AccountPurge.request(leaving)
+
+        call_command("purge_accounts", batch_size=2, pause=0, stdout=StringIO())
+
+        self.assertFalse(User.objects.filter(pk=leaving.pk).exists())
+        for model in (Expense, Income, Tag, Category, BalanceCheckpoint, Tombstone):
+            with self.subTest(model=model.__name__):
+                self.assertFalse(model.objects.filter(user_id=leaving.pk).exists())
+        legacy.refresh_from_db()
+        self.assertIsNone(legacy.category_id)
+        self.assertFalse(legacy.tags.exists())
+        self.assertGreater(legacy.change_seq, seq)
+
+
+class MergeTests(TestCase):
+    def test_overlapping_tags_merge_without_duplicate_links(self):
+        user, other = make_user("merger"), make_user("bystander")
+        food, lunch, meals = (Tag.objects.create(user=user, name=name) for name in ("Food", "Lunch", "Meals"))
+        both = make_expense(user, 100, date(FIXTURE_YEAR, 1, 1))
+        both.tags.add(food, lunch, meals)
+        one = make_expense(user, 200, date(FIXTURE_YEAR, 1, 2))
+        one.tags.add(lunch)
+        income = Income.objects.create(user=user, source="Refund", amount=Money(50), date=date(FIXTURE_YEAR, 1, 3))
+        income.tags.add(meals)
+        # A row from before tags were per user, tagged with one of the sources.
+        foreign = make_expense(other, 300, date(FIXTURE_YEAR, 1, 1))
+        foreign.tags.add(lunch)
+
+        self.assertEqual(merge_tags(user, [lunch, meals, food], food), 3)
+
+        through = Expense.tags.through
+        self.assertEqual(list(through.objects.filter(expense=both).values_list("tag_id", flat=True)), [food.pk])
+        self.assertEqual(list(one.tags.all()), [food])
+        self.assertEqual(list(income.tags.all()), [food])
+        self.assertFalse(foreign.tags.filter(pk=food.pk).exists())
+        self.assertEqual(list(Tag.objects.filter(user=user)), [food])
+
+    def test_merging_categories_moves_rows_and_removes_sources(self):
+        user = make_user("merger")
+        food, dining = Category.objects.create(user=user, name="Food"), Category.objects.create(user=user, name="Dining")
+        expense = make_expense(user, 100, date(FIXTURE_YEAR, 1, 1), category=dining)
+        income = Income.objects.create(
+            user=user, source="Refund", amount=Money(50), date=date(FIXTURE_YEAR, 1, 2), category=dining,
+        )
+        since = int(sync_page(user)["next"])
+
+        stranger = make_user("stranger")
+        foreign = Category.objects.create(user=stranger, name="Groceries")
+        self.assertEqual(merge_categories(user, [foreign], food), 0)
+        self.assertEqual(merge_categories(stranger, [dining], foreign), 0)
+        self.assertTrue(Category.objects.filter(pk=foreign.pk).exists())
+        self.assertEqual(merge_categories(user, [dining], food), 2)
+
+        self.assertEqual(Expense.objects.get(pk=expense.pk).category, food)
+        self.assertEqual(Income.objects.get(pk=income.pk).category, food)
+        changes = sync_page(user, since=since)["changes"]
+        self.assertEqual(
+            sorted((change["op"], change["model"]) for change in changes),
+            [("delete", "category"), ("upsert", "expense"), ("upsert", "income")],
+        )
+
+
+class ReportSnapshotTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = make_user("snapshotted")
+        self.client.force_login(self.user)
+        make_expense(self.user, 100, date(FIXTURE_YEAR, 1, 1))
+
+    def chart(self):
+        return self.client.get(reverse("home_chart"), {"year": FIXTURE_YEAR}).json()
+
+    def test_snapshots_from_an_older_ledger_version_are_ignored(self):
+        version = ledger_version(self.user)
+        store_snapshots([snapshot(self.user.pk, ReportSnapshot.CHART, FIXTURE_YEAR, version, {"stored": True})])
+        self.assertEqual(self.chart(), {"stored": True})
+
+        make_expense(self.user, 200, date(FIXTURE_YEAR, 2, 1))
+        self.assertNotIn("stored", self.chart())
+        self.assertIsNone(load_snapshot(self.user, ReportSnapshot.CHART, FIXTURE_YEAR, ledger_version(self.user)))
+
+
+class TypeaheadTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        typeahead._indexes.clear()
+        self.user = make_user("typist")
+        self.client.force_login(self.user)
+
+    def suggest(self, q, **params):
+        response = self.client.get(reverse("typeahead"), {"q": q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(item["kind"], item["name"]) for item in response.json()["results"]]
+
+    def test_matches_any_word_prefix_most_used_first(self):
+        shop = Category.objects.create(user=self.user, name="Coffee Shop")
+        Tag.objects.create(user=self.user, name="Coffee")
+        make_expense(self.user, 100, date(FIXTURE_YEAR, 1, 1), category=shop)
+        Tag.objects.create(user=self.user, name="Shopping")
+
+        self.assertEqual(self.suggest("cof"), [("category", "Coffee Shop"), ("tag", "Coffee")])
+        self.assertEqual(self.suggest("SHO"), [("category", "Coffee Shop"), ("tag", "Shopping")])
+        self.assertEqual(self.suggest("sho", kind="tag"), [("tag", "Shopping")])
+        self.assertEqual(self.suggest("cof", limit=1), [("category", "Coffee Shop")])
+
+    def test_only_the_users_own_names_are_suggested(self):
+        Tag.objects.create(user=make_user("stranger"), name="Secret")
+        self.assertEqual(self.suggest("sec"), [])
+
+    def test_index_follows_creates_and_merges(self):
+        lunch = Tag.objects.create(user=self.user, name="Lunch")
+        self.assertEqual(self.suggest("l"), [("tag", "Lunch")])
+        late = Tag.objects.create(user=self.user, name="Late")
+        self.assertEqual(sorted(self.suggest("l")), [("tag", "Late"), ("tag", "Lunch")])
+        merge_tags(self.user, [late], lunch)
+        self.assertEqual(self.suggest("l"), [("tag", "Lunch")])
+
+    def test_suggestions_need_view_permissions(self):
+        Tag.objects.create(user=self.user, name="Food")
+        Category.objects.create(user=self.user, name="Fuel")
+        self.user.user_permissions.remove(Permission.objects.get(codename="view_tag"))
+        self.user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(self.suggest("f"), [("category", "Fuel")])
+
+    def test_non_positive_limits_are_rejected(self):
+        for limit in ("0", "-5", "x"):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.client.get(reverse("typeahead"), {"limit": limit}).status_code, 400)
+
+
+class LedgerExportTests(TestCase):
+    def setUp(self):
+        self.user = make_user("exporter")
+        self.client.force_login(self.user)
+        food = Category.objects.create(user=self.user, name="Food")
+        self.tags = [Tag.objects.create(user=self.user, name=name) for name in ("b-tag", "a-tag", "c-tag")]
+        self.expenses = []
+        for i in range(5):
+            expense = make_expense(self.user, 1000 + i, date(FIXTURE_YEAR, 1, 1 + i), title=f"Lunch {i}", category=food)
+            expense.tags.set(self.tags[:i % 3 + 1])
+            self.expenses.append(expense)
+        self.income = Income.objects.create(user=self.user, source="Salary", amount=Money(50000), date=date(FIXTURE_YEAR, 1, 1))
+        make_expense(make_user("other"), 999, date(FIXTURE_YEAR, 1, 1), title="Not mine")
+
+    def export(self, fmt):
+        response = self.client.get(reverse("ledger_export", args=[fmt]))
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def expected_tags(self, i):
+        return sorted(tag.name for tag in self.tags[:i % 3 + 1])
+
+    def test_csv_lists_the_users_rows_with_their_tags(self):
+        rows = list(csv.reader(StringIO(self.export("csv"))))
+        self.assertEqual(rows[0], EXPORT_COLUMNS)
+        self.assertEqual(rows[1], [
+            "expense", str(self.expenses[0].pk), f"{FIXTURE_YEAR}-01-01", "Lunch 0", "10.00", "Food", "Cash", "b-tag",
+        ])
+        self.assertEqual([row[3] for row in rows[1:]], [f"Lunch {i}" for i in range(5)] + ["Salary"])
+        self.assertEqual(rows[-1][4], "500.00")
+
+    def test_ndjson_lists_the_users_rows_with_their_tags(self):
+        rows = [json.loads(line) for line in self.export("ndjson").splitlines()]
+        self.assertEqual([(row["type"], row["id"]) for row in rows], [
+            *(("expense", expense.pk) for expense in self.expenses), ("income", self.income.pk),
+        ])
+        self.assertEqual(rows[2]["amount"], "10.02")
+        self.assertEqual(rows[-1]["tags"], [])
+
+    def test_tags_stay_with_their_rows_across_chunks(self):
+        with mock.patch("finance.export.EXPORT_CHUNK_SIZE", 2):
+            rows = [json.loads(line) for line in self.export("ndjson").splitlines()]
+        self.assertEqual([row["tags"] for row in rows[:5]], [self.expected_tags(i) for i in range(5)])
+
+    def test_unknown_format_is_404(self):
+        self.assertEqual(self.client.get(reverse("ledger_export", args=["xml"])).status_code, 404)
+
+
+def sse_events(chunk):
+    """``(event, data)`` pairs in one chunk of a Server-Sent Events stream."""
+    events = []
+    for block in chunk.decode().strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields.get("event"), json.loads(fields["data"]) if "data" in fields else fields))
+    return events
+
+
+class DashboardEventsTests(TestCase):
+    def setUp(self):
+        # A bus of its own, so no subscriber outlives the test.
+        bus = InProcessBus()
+        for target in ("finance.events.get_bus", "finance.views.get_bus"):
+            patcher = mock.patch(target, return_value=bus)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_stream_sends_retry_then_transaction_and_totals(self):
+        user = await sync_to_async(make_user)("listener")
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.get(reverse("dashboard_events"))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertEqual(await anext(stream), b"retry: 5000\n\n")
+
+            def add_expense():
+                with self.captureOnCommitCallbacks(execute=True):
+                    return make_expense(user, 1250, date(FIXTURE_YEAR, 3, 1))
+
+            expense = await sync_to_async(add_expense)()
+            events = []
+            while len(events) < 2:
+                events += sse_events(await asyncio.wait_for(anext(stream), 5))
+        finally:
+            await stream.aclose()
+
+        (kind, change), (totals_kind, totals) = events
+        self.assertEqual((kind, change["action"], change["id"]), ("transaction", "added", expense.pk))
+        self.assertEqual(change["month"], f"{FIXTURE_YEAR}-03")
+        self.assertEqual((totals_kind, totals["month"]), ("totals", f"{FIXTURE_YEAR}-03"))
+
+    async def test_anonymous_requests_are_refused(self):
+        response = await self.async_client.get(reverse("dashboard_events"))
+        self.assertEqual(response.status_code, 401)
+
+    def test_wsgi_requests_get_no_content(self):
+        # EventSource does not reconnect after a 204, so a WSGI worker is never pinned.
+        self.client.force_login(make_user("wsgi"))
+        self.assertEqual(self.client.get(reverse("dashboard_events")).status_code, 204)
+
+
+class AdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", password="password")
+        make_ledger(make_user("first"), per_month=1, tag_count=3)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, model):
+        url = reverse(f"admin:finance_{model._meta.model_name}_changelist")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_changelists_render(self):
+        for model in (Expense, Income, Budget, Tag, Category, PaymentMethod):
+            with self.subTest(model=model.__name__):
+                self.changelist_queries(model)
+        self.assertEqual(self.client.get(reverse("admin:finance_expense_changelist"), {"q": "Expense"}).status_code, 200)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        models = (Expense, Income, Budget, Tag, Category)
+        before = [self.changelist_queries(model) for model in models]
+        make_ledger(make_user("second"), per_month=3, tag_count=5)
+        self.assertEqual([self.changelist_queries(model) for model in models], before)
+
+    def test_large_results_use_the_planner_estimate(self):
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value.fetchone.return_value = [[{"Plan": {"Plan Rows": 2_000_000}}]]
+        fake = mock.MagicMock(vendor="postgresql")
+        fake.cursor.return_value = cursor
+        with mock.patch("finance.admin.connections", {"default": fake}):
+            self.assertEqual(EstimatedCountPaginator(Expense.objects.all(), 50).count, 2_000_000)
+        self.assertEqual(EstimatedCountPaginator(Expense.objects.all(), 50).count, Expense.objects.count())
+
+
+@override_settings(RATE_LIMITS={}, SESSION_ENGINE="django.contrib.sessions.backends.db")
+class SessionWriteTests(TestCase):
+    def setUp(self):
+        self.client.force_login(make_user("browser"))
+
+    def session_writes(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(session_writes(queries))
+
+    def test_session_is_saved_only_when_the_month_changes(self):
+        url = reverse("dashboard")
+        self.assertEqual(self.session_writes(f"{url}?month={FIXTURE_YEAR}-03"), 1)
+        self.assertEqual(self.session_writes(f"{url}?month={FIXTURE_YEAR}-03"), 0)
+        self.assertEqual(self.session_writes(url), 0)
+        self.assertEqual(self.session_writes(f"{url}?month={FIXTURE_YEAR}-04"), 1)
+        self.assertEqual(self.client.session["selected_month"], f"{FIXTURE_YEAR}-04")
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = make_user("limited")
+        self.client.force_login(self.user)
+
+    @override_settings(RATE_LIMITS={"home_chart": {"per_minute": 1, "burst": 2}})
+    def test_requests_past_the_burst_are_rejected(self):
+        url = reverse("home_chart") + f"?year={FIXTURE_YEAR}"
+        self.assertEqual([self.client.get(url).status_code for _ in range(2)], [200, 200])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+        self.assertEqual(rejected_count("home_chart"), 1)
+
+    def test_buckets_are_per_key(self):
+        self.assertEqual([take_token("a", 60, 1), take_token("b", 60, 1)], [0, 0])
+        self.assertGreater(take_token("a", 60, 1), 0)
+
+    def test_concurrent_requests_cannot_exceed_the_burst(self):
+        with mock.patch("finance.ratelimit.time.time", return_value=1000.0), ThreadPoolExecutor(8) as pool:
+            waits = list(pool.map(lambda _: take_token("shared", 1, 5), range(40)))
+        self.assertEqual(waits.count(0), 5)
+
+    def test_no_double_burst_across_a_boundary(self):
+        def take_at(now):
+            with mock.patch("finance.ratelimit.time.time", return_value=now):
+                return take_token("edge", 1, 2)
+
+        self.assertEqual([take_at(1079.9), take_at(1079.9)], [0, 0])
+        self.assertGreater(take_at(1080.0), 0)
+        self.assertGreater(take_at(1139.8), 0)
+        self.assertEqual(take_at(1140.0), 0)
+        self.assertAlmostEqual(take_at(1140.0), 59.9, places=6)
+
+    @override_settings(RATE_LIMITS={"download_annual_report": {"max_in_flight": 1}})
+    def test_in_flight_limit(self):
+        caches["default"].set(f"ratelimit:inflight:download_annual_report:user:{self.user.pk}", 1)
+        self.assertEqual(self.client.get(reverse("download_annual_report")).status_code, 429)
+
+    @override_settings(RATE_LIMITS={"download_annual_report": {"max_in_flight": 1}})
+    def test_evicted_in_flight_counter_does_not_fail_the_request(self):
+        def evicting(user, year):
+            caches["default"].clear()
+            return annual_report_data(user, year)
+
+        with mock.patch("finance.views.annual_report_data", side_effect=evicting):
+            self.assertEqual(self.client.get(reverse("download_annual_report")).status_code, 200)
+
+
+class MoneyTests(SimpleTestCase):
+    def test_pickle_round_trip(self):
+        self.assertEqual(pickle.loads(pickle.dumps(Money(1250))), Money(1250))
+
+    def test_unchanged_amount_is_not_reported_as_changed(self):
+        expense = Expense(title="Lunch", amount=Money(1250), date=date(FIXTURE_YEAR, 1, 1))
+        form = ExpenseForm(instance=expense, data={"amount": "12.5"})
+        self.assertFalse(form.fields["amount"].has_changed(expense.amount, "12.5"))
+        self.assertNotIn("amount", form.changed_data)
+        self.assertTrue(form.fields["amount"].has_changed(expense.amount, "12.51"))
+
+    def test_serializer_round_trip_keeps_amounts(self):
+        expenses = [Expense(pk=1, title="Lunch", amount=Money(1250)), Expense(pk=2, title="Refund", amount=Money(-5))]
+        data = serializers.serialize("json", expenses, fields=["title", "amount"])
+        loaded = [item.object.amount for item in serializers.deserialize("json", data)]
+        self.assertEqual(loaded, [Money(1250), Money(-5)])
+
+
+@override_settings(REPLICA_DATABASE="test_replica", REPLICA_READ_VIEWS=["dashboard"], RATE_LIMITS={})
+@skipUnless("test_replica" in settings.DATABASES, "needs the test_replica alias from moneytomoney.test_settings")
+class ReplicaRoutingTests(TransactionTestCase):
+    # A transaction test case, so rows written through default are committed
+    # and visible on the mirror connection. Only aliases that exist are
+    # named: the runner sets up every alias a test names, skipped or not.
+    databases = {"default", "test_replica"} & set(settings.DATABASES)
+
+    def setUp(self):
+        clear_caches()
+        self.user = make_user("routed")
+        self.client.force_login(self.user)
+        make_expense(self.user, 100, date(FIXTURE_YEAR, 3, 1))
+        self.dashboard = reverse("dashboard") + f"?month={FIXTURE_YEAR}-03"
+
+    def get_dashboard(self):
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections["test_replica"]) as replica:
+            response = self.client.get(self.dashboard)
+        self.assertEqual(response.status_code, 200)
+        return [query["sql"] for query in primary], [query["sql"] for query in replica]
+
+    def test_listed_views_read_from_the_replica(self):
+        primary, replica = self.get_dashboard()
+        # The month's rows; balance checkpoints are built from the primary on purpose.
+        listing = '"finance_expense"."title"'
+        self.assertTrue(any(listing in sql for sql in replica))
+        self.assertFalse(any(listing in sql for sql in primary))
+        # Sessions and auth always come from the primary.
+        self.assertTrue(any("django_session" in sql for sql in primary))
+        self.assertFalse(any("django_session" in sql for sql in replica))
+
+    def test_a_write_pins_the_client_to_the_primary(self):
+        response = self.client.post(reverse("tag_create"), {"name": "Pinned"})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        primary, replica = self.get_dashboard()
+        self.assertEqual(replica, [])
+        self.assertTrue(any('"finance_expense"."title"' in sql for sql in primary))
+
+    def test_unlisted_views_use_the_primary(self):
+        with CaptureQueriesContext(connections["test_replica"]) as replica:
+            self.client.get(reverse("home_chart"), {"year": FIXTURE_YEAR})
+        self.assertEqual(len(replica), 0)
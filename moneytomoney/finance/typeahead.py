@@ -0,0 +1,118 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from heapq import nlargest
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Category, Expense, Income, Tag
+
+TYPEAHEAD_LIMIT = 10
+TYPEAHEAD_MAX_LIMIT = 50
+
+# Indexes kept per process; the least recently used are dropped first.
+MAX_INDEXES = 1000
+
+# Usage counts change with every transaction without invalidating the index;
+# rebuild after this many seconds so the ranking does not drift far.
+MAX_INDEX_AGE = 600
+
+_END = "\U0010ffff"
+
+
+def _version_key(user_id):
+    return f"typeahead:{user_id}"
+
+
+def invalidate(user_id):
+    """Make every process rebuild ``user_id``'s index on its next lookup."""
+    cache.set(_version_key(user_id), time.time_ns(), None)
+
+
+class PrefixIndex:
+    """Sorted lowercase keys for one user's tags and categories.
+
+    Each name is indexed under every word, so "coffee shop" matches both
+    "cof" and "sho". Lookups are two bisects plus a top-k by usage.
+    """
+
+    __slots__ = ("keys", "entries")
+
+    def __init__(self, items):
+        pairs = []
+        for item in items:
+            words = item["name"].lower().split()
+            for i in range(len(words)):
+                pairs.append((" ".join(words[i:]), item))
+        pairs.sort(key=lambda pair: pair[0])
+        self.keys = [key for key, _item in pairs]
+        self.entries = [item for _key, item in pairs]
+
+    def search(self, prefix, kinds=("tag", "category"), limit=TYPEAHEAD_LIMIT):
+        prefix = prefix.strip().lower()
+        low = bisect_left(self.keys, prefix)
+        high = bisect_left(self.keys, prefix + _END, low)
+        matches = {}
+        for item in self.entries[low:high]:
+            if item["kind"] in kinds:
+                matches[(item["kind"], item["id"])] = item
+        return nlargest(limit, matches.values(), key=lambda item: (item["uses"], -len(item["name"])))
+
+
+def _usage(model, field, user_id):
+    rows = model.objects.filter(user_id=user_id).values(field).annotate(uses=Count("pk")).order_by()
+    return {row[field]: row["uses"] for row in rows if row[field] is not None}
+
+
+def _tag_usage(model, user_id):
+    rows = (
+        model.tags.through.objects.filter(tag__user_id=user_id)
+        .values("tag_id").annotate(uses=Count("pk")).order_by()
+    )
+    return {row["tag_id"]: row["uses"] for row in rows}
+
+
+def build_index(user_id):
+    """Load the user's tags and categories with how often each is used."""
+    items = []
+    tag_uses = [_tag_usage(Expense, user_id), _tag_usage(Income, user_id)]
+    for pk, name in Tag.objects.filter(user_id=user_id).values_list("pk", "name"):
+        items.append({"kind": "tag", "id": pk, "name": name, "uses": sum(uses.get(pk, 0) for uses in tag_uses)})
+    category_uses = [_usage(Expense, "category_id", user_id), _usage(Income, "category_id", user_id)]
+    for pk, name in Category.objects.filter(user_id=user_id).values_list("pk", "name"):
+        items.append({"kind": "category", "id": pk, "name": name, "uses": sum(uses.get(pk, 0) for uses in category_uses)})
+    return PrefixIndex(items)
+
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_index(user_id):
+    """The user's index, rebuilt when a tag or category changed since it was built.
+
+    A warm lookup costs one cache read for the version.
+    """
+    version = cache.get(_version_key(user_id))
+    now = time.monotonic()
+    with _lock:
+        cached = _indexes.get(user_id)
+        if cached is not None and cached[0] == version and now - cached[1] < MAX_INDEX_AGE:
+            _indexes.move_to_end(user_id)
+            return cached[2]
+
+    index = build_index(user_id)
+    with _lock:
+        _indexes[user_id] = (version, now, index)
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def uses_typeahead(user):
+    """Whether ``user`` has enough tags that forms should not list them all."""
+    return Tag.objects.filter(user=user).count() > settings.TYPEAHEAD_TAG_THRESHOLD
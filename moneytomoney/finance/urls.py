@@ -3,8 +3,15 @@ from . import views
 
 urlpatterns = [
     path('', views.Home.as_view(), name='home'), 
+    path('home/chart/', views.HomeChartData.as_view(), name='home_chart'),
+    path('balance/', views.BalanceAsOf.as_view(), name='balance'),
     path('dashboard/', views.Dashboard.as_view(), name='dashboard'),
+    path('dashboard/events/', views.DashboardEvents.as_view(), name='dashboard_events'),
     path('download/annual-report/', views.DownloadAnnualReportView.as_view(), name='download_annual_report'),
+    path('export/ledger.<str:fmt>', views.LedgerExport.as_view(), name='ledger_export'),
+    path('typeahead/', views.Typeahead.as_view(), name='typeahead'),
+    path('sync/', views.Sync.as_view(), name='sync'),
+    path('ops/ratelimits/', views.RateLimitStats.as_view(), name='ratelimit_stats'),
 
     path('expenses/add/', views.ExpenseCreate.as_view(), name='expense_create'),
     path('expenses/<int:expense_id>/edit/', views.ExpenseUpdate.as_view(), name='expense_update'),
@@ -15,17 +22,23 @@ urlpatterns = [
     path('incomes/<int:income_id>/delete/', views.IncomeDelete.as_view(), name='income_delete'),
 
     path('budget/', views.BudgetCreateUpdate.as_view(), name='budget_create'),
+    path('budget/plan/', views.BudgetPlan.as_view(), name='budget_plan'),
+    path('budget/plan/api/', views.BudgetPlanApi.as_view(), name='budget_plan_api'),
 
     path('tags/add/', views.TagCreate.as_view(), name='tag_create'),
     path('tags/<int:tag_id>/edit/', views.TagUpdate.as_view(), name='tag_update'),
     path('tags/<int:tag_id>/delete/', views.TagDelete.as_view(), name='tag_delete'),
+    path('tags/merge/', views.TagMerge.as_view(), name='tag_merge'),
+    path('tags/analytics/', views.TagAnalytics.as_view(), name='tag_analytics'),
     
     path('categories/add/', views.CategoryCreate.as_view(), name='category_create'),
     path('categories/<int:category_id>/edit/', views.CategoryUpdate.as_view(), name='category_update'),
     path('categories/<int:category_id>/delete/', views.CategoryDelete.as_view(), name='category_delete'),
+    path('categories/merge/', views.CategoryMerge.as_view(), name='category_merge'),
 
     path('profile/', views.ProfileUpdateView.as_view(), name='profile'),
     path('profile/changepassword/', views.ChangePassword.as_view(), name='change_pass'),
+    path('profile/delete/', views.DeleteAccount.as_view(), name='delete_account'),
 
     path('login/', views.Login.as_view(), name='login'),
     path('logout/', views.Logout.as_view(), name='logout'),
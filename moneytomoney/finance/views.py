@@ -1,16 +1,69 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.models import User, Group
-from .models import Expense, Income, Budget, Tag, Category
-from .forms import *
+from .models import Expense, Income, Budget, Tag, Category, AccountPurge, ReportSnapshot
+from .forms import (
+    BudgetForm, BudgetPlanForm, CategoryForm, CategoryMergeForm, ChangepassForm, DeleteAccountForm, ExpenseForm,
+    IncomeForm, LoginForm, ProfileForm, RegisterForm, TagForm, TagMergeForm,
+)
 from django.views import View
-from django.db.models import *
+from django.db.models import Max, OuterRef, Subquery, Sum
 from django.contrib.auth import logout, login, update_session_auth_hash
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin, UserPassesTestMixin
 from django.core.exceptions import PermissionDenied
 from django.contrib import messages
-from datetime import *
-from openpyxl import Workbook
-from django.http import HttpResponse
+from datetime import date, datetime
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse, Http404, JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+import asyncio
+import json
+from .events import get_bus, sse_message
+from .export import ledger_rows, stream_csv, stream_ndjson
+from .analytics import tag_monthly_spend, tag_cooccurrence, yearly_chart_series
+from .reports import XLSX_CONTENT_TYPE, annual_report_data, annual_report_workbook
+from .snapshots import load_snapshot
+from .money import Money, MoneyJSONEncoder
+from .ledger import MAX_YEAR, MIN_YEAR, balance_as_of, month_balances
+from .sync import sync_page, ledger_version, SYNC_PAGE_SIZE
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from .budgets import upsert_budgets
+from .merge import merge_categories, merge_tags
+from .typeahead import TYPEAHEAD_LIMIT, TYPEAHEAD_MAX_LIMIT, get_index
+from .ratelimit import ConcurrencyLimitMixin, rate_limits, rejected_count
+
+# Years accepted from query strings. Keeps date arithmetic well away from
+# date.min/date.max and bounds how much history one request can touch.
+def parse_year(value):
+    """``value`` as a year between MIN_YEAR and MAX_YEAR, or None."""
+    try:
+        year = int(value)
+    except (TypeError, ValueError):
+        return None
+    return year if MIN_YEAR <= year <= MAX_YEAR else None
+
+
+def in_year_range(day):
+    """Whether ``day`` falls between MIN_YEAR and MAX_YEAR, which bounds ledger walks."""
+    return MIN_YEAR <= day.year <= MAX_YEAR
+
+
+def tags_version(model):
+    """Highest change_seq among a row's tags, used in the dashboard row cache key."""
+    fk_name = model._meta.model_name
+    return Subquery(
+        model.tags.through.objects.filter(**{fk_name: OuterRef('pk')})
+        .values(fk_name)
+        .annotate(version=Max('tag__change_seq'))
+        .values('version')
+    )
+
+
+def remember_month(request, month):
+    """Keep ``month`` as the user's selected month; the session is only written when it changes."""
+    if request.session.get('selected_month') != month:
+        request.session['selected_month'] = month
+
 
 class Login(View):
     def get(self, request):
@@ -61,40 +114,69 @@ class Home(LoginRequiredMixin, View):
         is_premium = user.groups.filter(name="premium").exists()
         current_year = datetime.now().year
 
-        expenses = Expense.objects.filter(user=user, date__year=current_year)
-        incomes = Income.objects.filter(user=user, date__year=current_year)
-
-        labels = []
-        income_data = []
-        expense_data = []
-
-        for m in range(1, 13):
-            labels.append(datetime(current_year, m, 1).strftime("%b"))
-            income_data.append(sum(i.amount for i in incomes.filter(date__month=m)))
-            expense_data.append(sum(e.amount for e in expenses.filter(date__month=m)))
-
-        chart_data = {
-            "labels": labels,
-            "incomes": income_data,
-            "expenses": expense_data
-        }
-
         context = {
             'selected_month': selected_month,
             'current_year': current_year,
-            'chart_data': chart_data,
             'is_premium': is_premium,
         }
         return render(request, 'home.html', context)
 
     def post(self, request):
         month = request.POST.get('month')
-        if month:
-            request.session['selected_month'] = month
+        try:
+            valid = in_year_range(datetime.strptime(month or '', "%Y-%m"))
+        except ValueError:
+            valid = False
+        if valid:
+            remember_month(request, month)
             return redirect(f"/dashboard/?month={month}")
         return redirect('home')
 
 
+class HomeChartData(LoginRequiredMixin, View):
+    cache_timeout = 60 * 60 * 24
+
+    def get(self, request):
+        year = parse_year(request.GET.get('year', datetime.now().year))
+        if year is None:
+            return JsonResponse({"error": f"year must be an integer from {MIN_YEAR} to {MAX_YEAR}."}, status=400)
+
+        # Every write bumps the user's ledger version, so it doubles as the
+        # ETag and as part of the cache key; stale entries simply expire.
+        version = ledger_version(request.user)
+        etag = quote_etag(f"{request.user.pk}-{year}-{version}")
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            key = f"home-chart:{request.user.pk}:{year}:{version}"
+            chart_data = cache.get(key)
+            if chart_data is None:
+                chart_data = (
+                    load_snapshot(request.user, ReportSnapshot.CHART, year, version)
+                    or yearly_chart_series(request.user, year)
+                )
+                cache.set(key, chart_data, self.cache_timeout)
+            response = JsonResponse(chart_data, encoder=MoneyJSONEncoder)
+
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class BalanceAsOf(LoginRequiredMixin, PermissionRequiredMixin, View):
+    permission_required = ["finance.view_income", "finance.view_expense"]
+
+    def get(self, request):
+        try:
+            day = date.fromisoformat(request.GET['date']) if 'date' in request.GET else date.today()
+        except ValueError:
+            return JsonResponse({"error": "date must be YYYY-MM-DD."}, status=400)
+        if not in_year_range(day):
+            return JsonResponse({"error": f"date must fall between {MIN_YEAR} and {MAX_YEAR}."}, status=400)
+
+        balance = balance_as_of(request.user, day)
+        return JsonResponse({"date": day, "balance": balance}, encoder=MoneyJSONEncoder)
+
+
 class Dashboard(LoginRequiredMixin, PermissionRequiredMixin, View):
     permission_required = ["finance.view_income", "finance.view_expense"]
 
@@ -107,19 +189,25 @@ class Dashboard(LoginRequiredMixin, PermissionRequiredMixin, View):
             selected_month = datetime.strptime(month_str, "%Y-%m")
         except ValueError:
             return redirect('home')
+        if not in_year_range(selected_month):
+            return HttpResponseBadRequest(f"month must fall between {MIN_YEAR} and {MAX_YEAR}.")
 
-        request.session['selected_month'] = month_str
+        remember_month(request, month_str)
 
         expenses = Expense.objects.filter(
             user=request.user,
             date__year=selected_month.year,
             date__month=selected_month.month
+        ).select_related('category', 'payment_method').prefetch_related('tags').annotate(
+            tags_version=tags_version(Expense),
         ).order_by('-date')
 
         incomes = Income.objects.filter(
             user=request.user,
             date__year=selected_month.year,
             date__month=selected_month.month
+        ).select_related('category').prefetch_related('tags').annotate(
+            tags_version=tags_version(Income),
         ).order_by('-date')
 
         budgets = Budget.objects.filter(
@@ -148,10 +236,11 @@ class Dashboard(LoginRequiredMixin, PermissionRequiredMixin, View):
                 expenses = expenses.filter(title__icontains=search).distinct()
                 incomes = incomes.filter(source__icontains=search).distinct()
 
-        total_expense = sum(e.amount for e in expenses)
-        total_income = sum(i.amount for i in incomes)
-        total_budget = sum(b.amount for b in budgets)
+        total_expense = Money.total(e.amount for e in expenses)
+        total_income = Money.total(i.amount for i in incomes)
+        total_budget = budgets.aggregate(total=Sum('amount'))['total'] or Money(0)
         remaining_budget = total_budget - total_expense
+        opening_balance, closing_balance = month_balances(request.user, selected_month.date())
 
         context = {
             'expenses': expenses,
@@ -161,6 +250,8 @@ class Dashboard(LoginRequiredMixin, PermissionRequiredMixin, View):
             'total_expense': total_expense,
             'total_income': total_income,
             'remaining_budget': remaining_budget,
+            'opening_balance': opening_balance,
+            'closing_balance': closing_balance,
             'search_query': search,
             'filter': a_filter,
             'selected_month': selected_month.strftime('%B %Y'),
@@ -169,20 +260,81 @@ class Dashboard(LoginRequiredMixin, PermissionRequiredMixin, View):
         return render(request, "dashboard.html", context)
 
 
+class DashboardEvents(View):
+    """Server-Sent Events stream of the user's ledger changes for open dashboards.
+
+    Only authentication touches the database; an idle connection just waits
+    on its in-memory queue and sends a comment every ``keepalive`` seconds.
+    Needs ASGI: served by a WSGI worker it answers 204 and the dashboard
+    simply goes without live updates.
+    """
+    permission_required = ["finance.view_income", "finance.view_expense"]
+    keepalive = 15
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            # Under WSGI the stream would pin a worker thread forever; 204 tells
+            # EventSource not to reconnect.
+            return HttpResponse(status=204)
+        user = await request.auser()
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+        if not await user.ahas_perms(self.permission_required):
+            return HttpResponse(status=403)
+
+        response = StreamingHttpResponse(self.stream(user.pk), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def stream(self, user_id):
+        bus = get_bus()
+        queue = bus.subscribe(user_id)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse_message(event)
+        finally:
+            bus.unsubscribe(user_id, queue)
+
+
+class Typeahead(LoginRequiredMixin, View):
+    """Autocomplete of the user's tags and categories by prefix, most used first."""
+
+    def get(self, request):
+        kinds = {"tag", "category"}
+        if request.GET.get("kind") in kinds:
+            kinds = {request.GET["kind"]}
+        if not request.user.has_perm("finance.view_tag"):
+            kinds.discard("tag")
+        if not request.user.has_perm("finance.view_category"):
+            kinds.discard("category")
+        try:
+            limit = min(int(request.GET.get("limit", TYPEAHEAD_LIMIT)), TYPEAHEAD_MAX_LIMIT)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return JsonResponse({"error": "limit must be a positive integer."}, status=400)
+
+        results = get_index(request.user.pk).search(request.GET.get("q", ""), kinds, limit)
+        return JsonResponse({"results": results})
+
+
 class ExpenseCreate(LoginRequiredMixin, PermissionRequiredMixin, View):
     permission_required = "finance.add_expense"
 
     def get(self, request):
-        form = ExpenseForm()
+        form = ExpenseForm(user=request.user)
         return render(request, "expense.html", {"form": form})
 
     def post(self, request):
-        form = ExpenseForm(request.POST)
-        if form.is_valid():
-            expense = form.save(commit=False)
-            expense.user = request.user
-            expense.save()
-            form.save_m2m()
+        form = ExpenseForm(request.POST, user=request.user)
+        if form.is_valid() and form.save_unless_duplicate(user=request.user):
             return redirect('dashboard')
 
         return render(request, "expense.html", {"form": form})
@@ -195,7 +347,7 @@ class ExpenseUpdate(LoginRequiredMixin, PermissionRequiredMixin, View):
         expense = Expense.objects.get(pk=expense_id)
         if expense.user != request.user:
             raise PermissionDenied("You do not have permission to edit this expense.")
-        form = ExpenseForm(instance=expense)
+        form = ExpenseForm(instance=expense, user=request.user)
         return render(request, "expense.html", {
             "form": form,
         })
@@ -204,9 +356,8 @@ class ExpenseUpdate(LoginRequiredMixin, PermissionRequiredMixin, View):
         expense = Expense.objects.get(pk=expense_id)
         if expense.user != request.user:
             raise PermissionDenied("You do not have permission to edit this expense.")
-        form = ExpenseForm(request.POST, instance=expense)
-        if form.is_valid():
-            form.save()
+        form = ExpenseForm(request.POST, instance=expense, user=request.user)
+        if form.is_valid() and form.save_unless_duplicate():
             return redirect('dashboard')
 
         return render(request, "expense.html", {
@@ -230,16 +381,12 @@ class IncomeCreate(LoginRequiredMixin, PermissionRequiredMixin, View):
     permission_required = "finance.add_income"
 
     def get(self, request):
-        form = IncomeForm()
+        form = IncomeForm(user=request.user)
         return render(request, "income.html", {"form": form})
 
     def post(self, request):
-        form = IncomeForm(request.POST)
-        if form.is_valid():
-            income = form.save(commit=False)
-            income.user = request.user
-            income.save()
-            form.save_m2m()
+        form = IncomeForm(request.POST, user=request.user)
+        if form.is_valid() and form.save_unless_duplicate(user=request.user):
             return redirect('dashboard')
 
         return render(request, "income.html", {"form": form})
@@ -252,7 +399,7 @@ class IncomeUpdate(LoginRequiredMixin, PermissionRequiredMixin, View):
         income = Income.objects.get(pk=income_id)
         if income.user != request.user:
             raise PermissionDenied("You do not have permission to edit this income.")
-        form = IncomeForm(instance=income)
+        form = IncomeForm(instance=income, user=request.user)
         return render(request, "income.html", {
             "form": form,
         })
@@ -261,9 +408,8 @@ class IncomeUpdate(LoginRequiredMixin, PermissionRequiredMixin, View):
         income = Income.objects.get(pk=income_id)
         if income.user != request.user:
             raise PermissionDenied("You do not have permission to edit this income.")
-        form = IncomeForm(request.POST, instance=income)
-        if form.is_valid():
-            form.save()
+        form = IncomeForm(request.POST, instance=income, user=request.user)
+        if form.is_valid() and form.save_unless_duplicate():
             return redirect('dashboard')
 
         return render(request, "income.html", {
@@ -296,21 +442,90 @@ class BudgetCreateUpdate(LoginRequiredMixin, PermissionRequiredMixin, View):
             month = form.cleaned_data['month']
             amount = form.cleaned_data['amount']
 
-            budget, created = Budget.objects.update_or_create(
-                user=request.user,
-                month=month,
-                defaults={'amount': amount}
-            )
+            upsert_budgets(request.user, {month: Money.from_decimal(amount)})
             return redirect('dashboard')
 
         return render(request, "budget.html", {"form": form})
 
 
+class BudgetPlan(LoginRequiredMixin, PermissionRequiredMixin, View):
+    permission_required = ["finance.add_budget", "finance.change_budget"]
+
+    def get(self, request):
+        form = BudgetPlanForm()
+        return render(request, "budgetplan.html", {"form": form})
+
+    def post(self, request):
+        form = BudgetPlanForm(request.POST)
+        if form.is_valid():
+            count = upsert_budgets(request.user, form.amounts(request.user))
+            messages.success(request, f'Budgets set for {count} month(s).')
+            return redirect('dashboard')
+
+        return render(request, "budgetplan.html", {"form": form})
+
+
+class BudgetPlanApi(LoginRequiredMixin, PermissionRequiredMixin, View):
+    """JSON version of BudgetPlan, e.g. ``{"start_month": "2025-01", "end_month": "2025-12", "amount": "500.00"}``."""
+    permission_required = ["finance.add_budget", "finance.change_budget"]
+
+    def post(self, request):
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"error": "Request body must be JSON."}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({"error": "Request body must be a JSON object."}, status=400)
+
+        # Only the form's own fields are read, and "mode" only from its choices.
+        mode = data.get("mode", "set")
+        modes = dict(BudgetPlanForm.base_fields["mode"].choices)
+        if not isinstance(mode, str) or mode not in modes:
+            return JsonResponse({"error": f"mode must be one of: {', '.join(modes)}."}, status=400)
+        fields = {name: data[name] for name in BudgetPlanForm.base_fields if name in data}
+        form = BudgetPlanForm({**fields, "mode": mode})
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors.get_json_data()}, status=400)
+
+        amounts = form.amounts(request.user)
+        upsert_budgets(request.user, amounts)
+        budgets = {month.strftime("%Y-%m"): amount for month, amount in sorted(amounts.items())}
+        return JsonResponse({"budgets": budgets}, encoder=MoneyJSONEncoder)
+
+
+class MergeView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    """Folds several of the user's tags or categories into one, moving their transactions along."""
+    form_class = None
+    merge = None
+    label = None
+    list_url = None
+
+    def render_form(self, request, form):
+        return render(request, "merge.html", {
+            "form": form,
+            "label": self.label,
+            "list_url": self.list_url,
+        })
+
+    def get(self, request):
+        form = self.form_class(user=request.user, initial={"sources": request.GET.getlist("source")})
+        return self.render_form(request, form)
+
+    def post(self, request):
+        form = self.form_class(request.POST, user=request.user)
+        if form.is_valid():
+            target = form.cleaned_data["target"]
+            moved = self.merge(request.user, form.cleaned_data["sources"], target)
+            messages.success(request, f'Merged into "{target.name}"; {moved} transaction(s) updated.')
+            return redirect(self.list_url)
+        return self.render_form(request, form)
+
+
 class TagCreate(LoginRequiredMixin, PermissionRequiredMixin, View):
     permission_required = ["finance.view_tag", "finance.add_tag"]
 
     def get(self, request):
-        form = TagForm()
+        form = TagForm(user=request.user)
         tags = Tag.objects.all()
         return render(request, "tag.html", {
             "form": form,
@@ -318,7 +533,7 @@ class TagCreate(LoginRequiredMixin, PermissionRequiredMixin, View):
         })
 
     def post(self, request):
-        form = TagForm(request.POST)
+        form = TagForm(request.POST, user=request.user)
         tags = Tag.objects.all()
 
         if form.is_valid():
@@ -340,7 +555,7 @@ class TagUpdate(LoginRequiredMixin, PermissionRequiredMixin, View):
         tag = Tag.objects.get(pk=tag_id)
         if tag.user != request.user:
             raise PermissionDenied("You do not have permission to edit this tag.")
-        form = TagForm(instance=tag)
+        form = TagForm(instance=tag, user=request.user)
         return render(request, "tagedit.html", {
             "form": form,
         })
@@ -349,7 +564,7 @@ class TagUpdate(LoginRequiredMixin, PermissionRequiredMixin, View):
         tag = Tag.objects.get(pk=tag_id)
         if tag.user != request.user:
             raise PermissionDenied("You do not have permission to edit this tag.")
-        form = TagForm(request.POST, instance=tag)
+        form = TagForm(request.POST, instance=tag, user=request.user)
         if form.is_valid():
             form.save()
             return redirect('tag_create')
@@ -372,11 +587,40 @@ class TagDelete(LoginRequiredMixin, PermissionRequiredMixin, View):
         return redirect("tag_create")
 
 
+class TagMerge(MergeView):
+    permission_required = ["finance.change_tag", "finance.delete_tag"]
+    form_class = TagMergeForm
+    merge = staticmethod(merge_tags)
+    label = "Tags"
+    list_url = "tag_create"
+
+
+class TagAnalytics(LoginRequiredMixin, PermissionRequiredMixin, View):
+    permission_required = ["finance.view_tag", "finance.view_expense", "finance.view_income"]
+
+    def get(self, request):
+        year = parse_year(request.GET.get("year", datetime.now().year))
+        if year is None:
+            return HttpResponseBadRequest(f"year must be an integer from {MIN_YEAR} to {MAX_YEAR}.")
+
+        cooccurrence = tag_cooccurrence(request.user, year)
+
+        context = {
+            'year': year,
+            'month_labels': [datetime(year, m, 1).strftime("%b") for m in range(1, 13)],
+            'spend_rows': tag_monthly_spend(request.user, year),
+            'cooccurrence': cooccurrence,
+            'matrix_rows': list(zip(cooccurrence['labels'], cooccurrence['matrix'])),
+            'top_pairs': cooccurrence['pairs'][:20],
+        }
+        return render(request, "taganalytics.html", context)
+
+
 class CategoryCreate(LoginRequiredMixin, PermissionRequiredMixin, View):
     permission_required = ["finance.view_category", "finance.add_category"]
     
     def get(self, request):
-        form = CategoryForm()
+        form = CategoryForm(user=request.user)
         categories = Category.objects.all()
         return render(request, "category.html", {
             "form": form,
@@ -384,7 +628,7 @@ class CategoryCreate(LoginRequiredMixin, PermissionRequiredMixin, View):
         })
 
     def post(self, request):
-        form = CategoryForm(request.POST)
+        form = CategoryForm(request.POST, user=request.user)
         categories = Category.objects.all()
 
         if form.is_valid():
@@ -406,7 +650,7 @@ class CategoryUpdate(LoginRequiredMixin, PermissionRequiredMixin, View):
         category = Category.objects.get(pk=category_id)
         if category.user != request.user:
             raise PermissionDenied("You do not have permission to edit this category.")
-        form = CategoryForm(instance=category)
+        form = CategoryForm(instance=category, user=request.user)
         
         return render(request, "categoryedit.html", {
             "form": form,
@@ -416,7 +660,7 @@ class CategoryUpdate(LoginRequiredMixin, PermissionRequiredMixin, View):
         category = Category.objects.get(pk=category_id)
         if category.user != request.user:
             raise PermissionDenied("You do not have permission to edit this category.")
-        form = CategoryForm(request.POST, instance=category)
+        form = CategoryForm(request.POST, instance=category, user=request.user)
         if form.is_valid():
             form.save()
             return redirect('category_create')
@@ -438,6 +682,14 @@ class CategoryDelete(LoginRequiredMixin, PermissionRequiredMixin, View):
         return redirect('category_create')
 
 
+class CategoryMerge(MergeView):
+    permission_required = ["finance.change_category", "finance.delete_category"]
+    form_class = CategoryMergeForm
+    merge = staticmethod(merge_categories)
+    label = "Categories"
+    list_url = "category_create"
+
+
 class ProfileUpdateView(LoginRequiredMixin, View):
     def get(self, request):
         form = ProfileForm(instance=request.user)
@@ -467,7 +719,24 @@ class ChangePassword(LoginRequiredMixin, View):
         return render(request, 'changepass.html', {'form': form})
 
 
-class DownloadAnnualReportView(LoginRequiredMixin, UserPassesTestMixin, View):
+class DeleteAccount(LoginRequiredMixin, View):
+    """Deactivates the account at once; purge_accounts deletes its data later in small batches."""
+
+    def get(self, request):
+        form = DeleteAccountForm(user=request.user)
+        return render(request, 'deleteaccount.html', {'form': form})
+
+    def post(self, request):
+        form = DeleteAccountForm(request.POST, user=request.user)
+        if form.is_valid():
+            AccountPurge.request(request.user)
+            logout(request)
+            messages.success(request, 'Your account has been deleted.')
+            return redirect('login')
+        return render(request, 'deleteaccount.html', {'form': form})
+
+
+class DownloadAnnualReportView(LoginRequiredMixin, UserPassesTestMixin, ConcurrencyLimitMixin, View):
     def test_func(self):
         return self.request.user.groups.filter(name='premium').exists()
 
@@ -475,44 +744,56 @@ class DownloadAnnualReportView(LoginRequiredMixin, UserPassesTestMixin, View):
         user = request.user
         current_year = datetime.now().year
 
-        incomes = Income.objects.filter(user=user, date__year=current_year)
-        expenses = Expense.objects.filter(user=user, date__year=current_year)
+        data = (
+            load_snapshot(user, ReportSnapshot.ANNUAL_REPORT, current_year, ledger_version(user))
+            or annual_report_data(user, current_year)
+        )
+        wb = annual_report_workbook(data, current_year)
 
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Annual Summary"
+        response = HttpResponse(content_type=XLSX_CONTENT_TYPE)
+        filename = f"annual_report_{current_year}.xlsx"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
 
-        ws.append(["Month", "Category", "Total Income", "Total Expense", "Net Balance"])
+        wb.save(response)
+        return response
 
-        categories = list(Category.objects.all()) + [None]
+class LedgerExport(LoginRequiredMixin, PermissionRequiredMixin, View):
+    permission_required = ["finance.view_income", "finance.view_expense"]
 
-        for m in range(1, 13):
-            month_name = datetime(current_year, m, 1).strftime("%B")
-            for cat in categories:
-                if cat is None:
-                    cat_name = "Uncategorized"
-                    total_income = sum(i.amount for i in incomes.filter(date__month=m, category__isnull=True))
-                    total_expense = sum(e.amount for e in expenses.filter(date__month=m, category__isnull=True))
-                else:
-                    cat_name = cat.name
-                    total_income = sum(i.amount for i in incomes.filter(date__month=m, category=cat))
-                    total_expense = sum(e.amount for e in expenses.filter(date__month=m, category=cat))
+    formats = {
+        "csv": (stream_csv, "text/csv"),
+        "ndjson": (stream_ndjson, "application/x-ndjson"),
+    }
 
-                net = total_income - total_expense
+    def get(self, request, fmt):
+        if fmt not in self.formats:
+            raise Http404("Unknown export format.")
+        stream, content_type = self.formats[fmt]
 
-                if total_income != 0 or total_expense != 0:
-                    ws.append([month_name, cat_name, total_income, total_expense, net])
+        response = StreamingHttpResponse(stream(ledger_rows(request.user)), content_type=content_type)
+        filename = f"ledger_{datetime.now():%Y%m%d}.{fmt}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
 
-        total_income_year = sum(i.amount for i in incomes)
-        total_expense_year = sum(e.amount for e in expenses)
-        ws.append(["", "", "", "", ""])
-        ws.append(["Total", "", total_income_year, total_expense_year, total_income_year - total_expense_year])
 
-        response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        filename = f"annual_report_{current_year}.xlsx"
-        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+class Sync(LoginRequiredMixin, View):
+    def get(self, request):
+        try:
+            since = int(request.GET.get("since", 0))
+            limit = int(request.GET.get("limit", SYNC_PAGE_SIZE))
+        except ValueError:
+            return JsonResponse({"error": "since and limit must be integers."}, status=400)
 
-        wb.save(response)
-        return response
\ No newline at end of file
+        return JsonResponse(sync_page(request.user, since, limit), encoder=MoneyJSONEncoder)
+
+
+class RateLimitStats(LoginRequiredMixin, UserPassesTestMixin, View):
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        stats = {
+            name: {"rule": rule, "rejected": rejected_count(name)}
+            for name, rule in rate_limits().items()
+        }
+        return JsonResponse(stats)
@@ -2,6 +2,8 @@
 ASGI config for moneytomoney project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The live dashboard stream (dashboard/events/) is only served through this
+entry point, e.g. ``uvicorn moneytomoney.asgi:application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,23 +50,54 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'finance.ratelimit.RateLimitMiddleware',
+    'finance.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-user limits for expensive pages, keyed by URL name (see finance/ratelimit.py).
+# Rejections per URL name are reported at /ops/ratelimits/ for staff.
+RATE_LIMITS = {
+    'download_annual_report': {'per_minute': 6, 'burst': 3, 'max_in_flight': 1},
+    'dashboard': {'per_minute': 30, 'burst': 10, 'param': 'search'},
+}
+
+# Users with more tags than this pick tags by typing, with autocomplete from
+# typeahead/, instead of from a multi-select listing every tag.
+TYPEAHEAD_TAG_THRESHOLD = 50
+
+# What the expense/income forms do with a transaction matching an existing one
+# on date, amount and title/source: 'warn' (the user may save anyway) or 'reject'.
+DUPLICATE_TRANSACTIONS = os.environ.get('DUPLICATE_TRANSACTIONS', 'warn')
+
+# Cold start limits for a fresh worker, checked by `manage.py bench_startup` and
+# the test suite: importing the WSGI app, then serving its first request.
+STARTUP_BUDGET = {
+    'import_seconds': float(os.environ.get('STARTUP_IMPORT_BUDGET', 2.0)),
+    'first_request_seconds': float(os.environ.get('STARTUP_FIRST_REQUEST_BUDGET', 1.0)),
+}
+
 ROOT_URLCONF = 'moneytomoney.urls'
 
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compiled templates are kept in memory; with DEBUG on, Django
+            # still reloads them when the files change.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -87,6 +119,86 @@ DATABASES = {
     }
 }
 
+# Read replica used by REPLICA_READ_VIEWS (see finance/routers.py). Point
+# DATABASE_REPLICA_HOST at a streaming replica of the primary, or at a second
+# local server for testing.
+if os.environ.get("DATABASE_REPLICA_HOST"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": os.environ["DATABASE_REPLICA_HOST"],
+        "PORT": os.environ.get("DATABASE_REPLICA_PORT", DATABASES["default"]["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ['finance.routers.PrimaryReplicaRouter']
+
+REPLICA_DATABASE = "replica"
+
+REPLICA_READ_VIEWS = [
+    'home',
+    'home_chart',
+    'dashboard',
+    'download_annual_report',
+    'tag_create',
+    'category_create',
+]
+
+# After a write, the client reads from the primary for this many seconds.
+REPLICA_PIN_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Set REDIS_URL in production so all workers share one cache. Rendered
+# dashboard rows go to their own "fragments" cache, so the many row entries
+# cannot evict rate-limit buckets, typeahead versions or chart data.
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        },
+        "fragments": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+            "KEY_PREFIX": "fragments",
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+        "fragments": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "fragments",
+            "OPTIONS": {"MAX_ENTRIES": 5000},
+        },
+    }
+
+# Live dashboard events (dashboard/events/, ASGI only). The in-process bus only
+# reaches connections held by the same worker; with several workers, events go
+# through Redis pub/sub instead.
+
+if os.environ.get("REDIS_URL"):
+    LIVE_EVENTS_BUS = "finance.events.RedisBus"
+    LIVE_EVENTS_REDIS_URL = os.environ["REDIS_URL"]
+else:
+    LIVE_EVENTS_BUS = "finance.events.InProcessBus"
+
+
+# Sessions
+# https://docs.djangoproject.com/en/5.2/topics/http/sessions/
+# SESSION_ENGINE=cached_db serves session reads from the cache and writes
+# through to the database; SESSION_ENGINE=signed_cookies keeps the session in
+# the browser with no server-side storage. Either way a session is only saved
+# when a view changes it.
+
+SESSION_ENGINE = os.environ.get("SESSION_ENGINE", "db")
+if "." not in SESSION_ENGINE:
+    SESSION_ENGINE = f"django.contrib.sessions.backends.{SESSION_ENGINE}"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,8 @@
+"""Settings for the test suite; ``manage.py test`` uses them by default."""
+
+from .settings import *
+
+# Stands in for a replica: it mirrors the test database, so routing can be
+# asserted per connection without a second server. Nothing routes here
+# unless REPLICA_DATABASE names it.
+DATABASES["test_replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}